@@ -6,61 +6,31 @@
 # PyschoPy Version: 1.85.3
 # Python Version:   2.7.5
 ###############################################################################
+from psychoblocks import startup
 import os
-import serial
-from psychopy import core, gui, data, logging, visual, clock
-from psychoblocks import const, experiment, routines
+from psychopy import logging
+from psychoblocks import const, experiment, launcher, plan, routines, session
+startup.mark('imports')
 
-if (__name__ == '__main__'):
-    app = experiment.Experiment('1back')
-
-    # add routines to the app
-    app.addRoutine(routines.OneBackInstructions(app))
-    app.addRoutine(routines.CountdownSequence(app))
-
-    # build the trial sequence and add to the app
-    runCSV = data.importConditions('1back/runs/run1.csv')
-
-    firstBlock = True
+# the routines of a run are compiled from the task spec
+buildRun = plan.planRunner(os.path.join('1back', const.TASK_SPEC_FILE))
 
-    for line in runCSV:
+def introduction(app):
+    """
+    The routines shown before each run
+    """
+    return [routines.OneBackInstructions(app), routines.CountdownSequence(app)]
 
-        if firstBlock:
-            firstBlock = False
-        else:
-            # after each block there should be a rest block
-            app.addRoutine(routines.RestBlock(app, duration = 15.0))
-
-        blockCSV = data.importConditions(line['blockFile'])
-        # discriminate between 0 and 1 back
-        if (int(line['is0back']) == 1):
-            is0 = True
-            # a silly way to find the target image
-            targetStim = None
-            for trial in blockCSV:
-                if trial['TargetType'] == 'target':
-                    target=os.path.join(const.DEFAULT_STIMULI_FOLDER,trial['Stimulus'])
-                    break
-            app.addRoutine(routines.ZeroBackCue(app,target))
-        else:
-            is0 = False
-            app.addRoutine(routines.OneBackCue(app))
-    
-        firstTrial = True
-
-        for trial in blockCSV:
-            image=os.path.join(const.DEFAULT_STIMULI_FOLDER,trial['Stimulus'])
-            trialRoutine = routines.NBackTrial(app,image,None)
-            # after each trial there should be a brief fixation
-            if firstTrial:
-                firstTrial = False
-            else:
-                app.addRoutine(routines.Fixation(app,duration = 0.5))
+if (__name__ == '__main__'):
+    experimentArgs, runs = launcher.parseArgs('1back')
+    app = experiment.Experiment('1back', **experimentArgs)
 
-            app.addRoutine(trialRoutine)
+    # queue the runs (the run file from the parameters if none were given)
+    runner = session.Session(app, buildRun, introduction)
+    for runFile, participant in runs:
+        runner.addRun(runFile, participant)
 
-    
     # ready freddy go!
-    app.run()
+    runner.run()
     # write out the logfile
     logging.flush()
@@ -6,64 +6,31 @@
 # PyschoPy Version: 1.85.3
 # Python Version:   2.7.5
 ###############################################################################
+from psychoblocks import startup
 import os
-import serial
-from psychopy import core, gui, data, logging, visual, clock
+from psychopy import logging
+from psychoblocks import const, experiment, launcher, plan, routines, session
+startup.mark('imports')
 
-import const
-import experiment
+# the routines of a run are compiled from the task spec
+buildRun = plan.planRunner(os.path.join('2back', const.TASK_SPEC_FILE))
 
-from colls import *
+def introduction(app):
+    """
+    The routines shown before each run
+    """
+    return [routines.TwoBackInstructions(app), routines.CountdownSequence(app)]
 
 if (__name__ == '__main__'):
-    app = experiment.Experiment('2back')
+    experimentArgs, runs = launcher.parseArgs('2back')
+    app = experiment.Experiment('2back', **experimentArgs)
 
-    # add routines to the app
-    app.addRoutine(TwoBackInstructions(app))
-    app.addRoutine(CountdownSequence(app))
+    # queue the runs (the run file from the parameters if none were given)
+    runner = session.Session(app, buildRun, introduction)
+    for runFile, participant in runs:
+        runner.addRun(runFile, participant)
 
-    # build the trial sequence and add to the app
-    runCSV = data.importConditions('2back/runs/run1.csv')
-
-    firstBlock = True
-
-    for line in runCSV:
-    
-        if firstBlock:
-            firstBlock = False
-        else:
-            # after each block there should be a rest block
-            app.addRoutine(RestBlock(app, duration = 15.0))
-
-        blockCSV = data.importConditions(line['blockFile'])
-        # discriminate between 0 and 1 back
-        if (int(line['is0back']) == 1):
-            is0 = True
-            # a silly way to find the target image
-            targetStim = None
-            for trial in blockCSV:
-                if trial['TargetType'] == 'target':
-                    target=os.path.join(const.DEFAULT_STIMULI_FOLDER,trial['Stimulus'])
-                    break
-            app.addRoutine(ZeroBackCue(app,target))
-        else:
-            is0 = False
-            app.addRoutine(TwoBackCue(app))
-        firstTrial = True 
-
-        for trial in blockCSV:
-            image=os.path.join(const.DEFAULT_STIMULI_FOLDER,trial['Stimulus'])
-            trialRoutine = NBackTrial(app,image,None)
-            # after each trial there should be a brief fixation
-            if firstTrial:
-                firstTrial = False
-            else:
-                app.addRoutine(Fixation(app,duration = 0.5))
-
-            app.addRoutine(trialRoutine)
-
-    
     # ready freddy go!
-    app.run()
+    runner.run()
     # write out the logfile
     logging.flush()
@@ -6,61 +6,31 @@
 # PyschoPy Version: 1.85.3
 # Python Version:   2.7.5
 ###############################################################################
+from psychoblocks import startup
 import os
-import serial
-from psychopy import core, gui, data, logging, visual, clock
+from psychopy import logging
+from psychoblocks import const, experiment, launcher, plan, routines, session
+startup.mark('imports')
 
-import const
-import experiment
-from colls import *
+# the routines of a run are compiled from the task spec
+buildRun = plan.planRunner(os.path.join('facename', const.TASK_SPEC_FILE))
 
-if (__name__ == '__main__'):
-    app = experiment.Experiment('facename')
-
-    # add routines to the app
-    app.addRoutine(FacenameInstructions(app))
-    app.addRoutine(CountdownSequence(app))
-
-    # build the trial sequence and add to the app
-    runCSV = data.importConditions('facename/runs/run1.csv')
-    
-    firstBlock = True
-    for line in runCSV:
-
-        if firstBlock: 
-            firstBlock = False
-        else:
-            # after each block there should be a rest block
-            app.addRoutine(RestBlock(app))
+def introduction(app):
+    """
+    The routines shown before each run
+    """
+    return [routines.FacenameInstructions(app), routines.CountdownSequence(app)]
 
-        blockCSV = data.importConditions(line['blockFile'])
-        # discriminate between known and novel trials
-        if (int(line['isKnown']) == 1):
-            isKnown = True
-            app.addRoutine(KnownCue(app))
-        else:
-            isKnown = False
-            app.addRoutine(NovelCue(app))
-        firstTrial = True
-
-        for trial in blockCSV:
-            image = os.path.join(const.DEFAULT_STIMULI_FOLDER,trial['image'])
-            if isKnown:
-                trialRoutine = KnownTrial(app, image, trial['name1'], trial['name2'], None)
-            else:
-                trialRoutine = NovelTrial(app, image, trial['name'])
-
-            # after each trial there should be a brief fixation
-            if firstTrial:
-                firstTrial = False
-            else: 
-                app.addRoutine(Fixation(app))
+if (__name__ == '__main__'):
+    experimentArgs, runs = launcher.parseArgs('facename')
+    app = experiment.Experiment('facename', **experimentArgs)
 
-            app.addRoutine(trialRoutine)
+    # queue the runs (the run file from the parameters if none were given)
+    runner = session.Session(app, buildRun, introduction)
+    for runFile, participant in runs:
+        runner.addRun(runFile, participant)
 
-    
     # ready freddy go!
-    app.run()
-    print('hello')
+    runner.run()
     # write out the logfile
     logging.flush()
@@ -55,31 +55,155 @@ class AbstractFeature(object):
 
     def start(self):
         """
-        Calls the start methods of origin features to prepare them to be run.
+        Calls startFeature, the start methods of origin features, and then afterStart.
 
-        If extending this class, make sure you use super to call this function.
+        Features should override the hooks rather than this method, so that loops can
+        compile the chain (see CompiledChain).  If extending this method, make sure you use
+        super to call this function.
         """
+        self.startFeature()
         if self.origin:
             self.origin.start()
+        self.afterStart()
 
     def run(self):
         """
-        Calls the run methods of origin features to execute them.
+        Calls runFeature and then the run methods of origin features to execute them.
 
-        If extending this class, make sure you use super to call this function.
+        Features should override the hooks rather than this method, so that loops can
+        compile the chain (see CompiledChain).  If extending this method, make sure you use
+        super to call this function.
         """
+        self.runFeature()
         if self.origin:
             self.origin.run()
 
     def end(self):
         """
-        Calls the end methods of origin features to indicate they are done being run
+        Calls endFeature and then the end methods of origin features to indicate they are 
+        done being run.
 
-        If extending this class, make sure you use super to call this function.
+        Features should override the hooks rather than this method, so that loops can
+        compile the chain (see CompiledChain).  If extending this method, make sure you use
+        super to call this function.
         """
+        self.endFeature()
         if self.origin:
             self.origin.end()
 
+    def startFeature(self):
+        """
+        Hook for this feature's own start up, called before origin features are started.
+        """
+        pass
+
+    def afterStart(self):
+        """
+        Hook for this feature's own start up, called after origin features are started.
+        """
+        pass
+
+    def runFeature(self):
+        """
+        Hook for this feature's own per frame work, called before origin features are run.
+        """
+        pass
+
+    def endFeature(self):
+        """
+        Hook for this feature's own clean up, called before origin features are ended.
+        """
+        pass
+
+    def prepare(self):
+        """
+        Calls the prepare methods of origin features so that any expensive resources
+        (e.g textures) are loaded ahead of time.
+
+        Preparing should be idempotent; start() will still work if prepare() was never called.
+        If extending this class, make sure you use super to call this function.
+        """
+        if self.origin:
+            self.origin.prepare()
+
+    def release(self):
+        """
+        Calls the release methods of origin features so that any resources loaded by 
+        prepare can be freed.
+
+        If extending this class, make sure you use super to call this function.
+        """
+        if self.origin:
+            self.origin.release()
+
+def _overrides(feature, name, base = AbstractFeature):
+    """
+    Check whether the class of feature overrides the named method of base.
+    """
+    method = getattr(type(feature), name)
+    default = getattr(base, name)
+    # unwrap unbound methods so this works on both python 2 and 3
+    return getattr(method, '__func__', method) is not getattr(default, '__func__', default)
+
+class CompiledChain(object):
+    """
+    A decorator chain flattened into lists of bound methods.
+
+    Running a chain recursively costs a method call and property lookup per feature on
+    every frame, whether or not the feature has per frame work.  Compiling walks the chain
+    once and keeps only the hooks each feature overrides, in the order the recursive calls
+    would make them.  A feature which overrides start, run or end itself (e.g a collection
+    or loop) can't be flattened, so it is kept as a single step covering the rest of the
+    chain.
+    """
+
+    def __init__(self, feature):
+        """
+        Initialize an instance of CompiledChain.
+
+        Parameters
+        ----------
+        feature : AbstractFeature
+            The outermost feature of the chain.
+        """
+        startSteps = list()
+        afterSteps = list()
+        runSteps = list()
+        endSteps = list()
+        while feature is not None:
+            if (_overrides(feature, 'start') or _overrides(feature, 'run') or 
+                    _overrides(feature, 'end')):
+                startSteps.append(feature.start)
+                runSteps.append(feature.run)
+                endSteps.append(feature.end)
+                break
+            if _overrides(feature, 'startFeature'):
+                startSteps.append(feature.startFeature)
+            if _overrides(feature, 'afterStart'):
+                afterSteps.append(feature.afterStart)
+            if _overrides(feature, 'runFeature'):
+                runSteps.append(feature.runFeature)
+            if _overrides(feature, 'endFeature'):
+                endSteps.append(feature.endFeature)
+            feature = feature.origin
+        # after start hooks unwind from the innermost feature outwards
+        afterSteps.reverse()
+        self._startSteps = tuple(startSteps + afterSteps)
+        self._runSteps = tuple(runSteps)
+        self._endSteps = tuple(endSteps)
+
+    def start(self):
+        for step in self._startSteps:
+            step()
+
+    def run(self):
+        for step in self._runSteps:
+            step()
+
+    def end(self):
+        for step in self._endSteps:
+            step()
+
 class AbstractCollection(AbstractFeature):
     """
     This class should be used to make declarations more legible and to abstract away
@@ -133,6 +257,20 @@ class AbstractCollection(AbstractFeature):
         """
         pass
 
+    def prepare(self):
+        """
+        Prepare the contents of the collection.
+        """
+        super(AbstractCollection,self).prepare()
+        self.feature.prepare()
+
+    def release(self):
+        """
+        Release the contents of the collection.
+        """
+        super(AbstractCollection,self).release()
+        self.feature.release()
+
 class AbstractLoop(AbstractFeature):
     """
     This class is similar to a collection; however, it provides a mechanism
@@ -162,6 +300,7 @@ class AbstractLoop(AbstractFeature):
             The experiment to which the feature belongs. Not neccesary if this is not the base.
         """
         super(AbstractLoop,self).__init__(origin, experiment = experiment)
+        self._compiled = None
 
     @abstractmethod
     def initializeLoop(self):
@@ -195,12 +334,21 @@ class AbstractLoop(AbstractFeature):
         """
         Continuously runs the origin feature until stats = False
         """
+        # the chain doesn't change once built, so flatten it the first time through
+        if self._compiled is None:
+            self._compiled = CompiledChain(self.origin)
+        chain = self._compiled
         self.initializeLoop()
-        self.origin.start()
+        chain.start()
+        frameTimer = self.experiment.frameTimer
         while(self.status):
-            self.origin.run()
+            if frameTimer:
+                frameTimer.startRun()
+            chain.run()
+            if frameTimer:
+                frameTimer.endRun()
             self.updateStatus()
-        self.origin.end()
+        chain.end()
         self.destroyLoop()
 
     def end(self):
@@ -235,4 +383,58 @@ class IteratingFeature(AbstractFeature):
         Does nothing.  Origin feature will be ended when this loop is run
         """
         pass
+
+    def prepare(self):
+        """
+        Prepare each of the features in the list.
+        """
+        for f in self._featureList:
+            f.prepare()
+
+    def release(self):
+        """
+        Release each of the features in the list.
+        """
+        for f in self._featureList:
+            f.release()
     
+
+class AbstractResponseDevice(object):
+    """
+    Interface for sources of response box data (e.g the serial port or a simulator).
+
+    Data is delivered as events with a code (the byte value) and a timestamp on the
+    experiment clock.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def poll(self):
+        """
+        Remove and return all events received so far, in the order they arrived.
+        """
+        return list()
+
+    @abstractmethod
+    def waitFor(self, code, timeout = None):
+        """
+        Block until an event with the given code arrives, discarding any other events.
+
+        Returns the matching event, or None if the timeout expired.
+        """
+        return None
+
+    @abstractmethod
+    def reset(self):
+        """
+        Discard any events which have not been consumed.
+        """
+        pass
+
+    @abstractmethod
+    def stop(self):
+        """
+        Stop the device.
+        """
+        pass
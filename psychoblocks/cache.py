@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module contains a process-wide cache of decoded stimulus images so that repeated
+stimuli (e.g n-back targets and lures) share a single pixel buffer, and a pool of
+stimuli so that identical stimuli (e.g fixation crosses and prompts) are only created
+once.
+"""
+import os
+from collections import OrderedDict
+from PIL import Image
+from psychopy import logging
+
+import const
+
+class TextureCache(object):
+    """
+    Least recently used cache of decoded images with a memory budget.
+
+    Entries are keyed by the absolute path of the image and the parameters used to
+    render it.  When the cache holds more than budget bytes, the least recently used
+    entries are evicted.  Images still referenced elsewhere (e.g by an ImageStim) are
+    unaffected by eviction; they will simply be decoded again on the next request.
+
+    Attributes
+    ----------
+    budget : int
+        Maximum number of bytes of decoded image data to hold.
+    hits : int
+        Number of requests served from the cache.
+    misses : int
+        Number of requests which required the image to be decoded.
+    evictions : int
+        Number of entries evicted to stay within the budget.
+    size : int
+        Number of bytes currently held.
+    """
+
+    def __init__(self, budget = const.TEXTURE_CACHE_BUDGET):
+        """
+        Initialize an instance of TextureCache.
+
+        Parameters
+        ----------
+        budget : int
+            Maximum number of bytes of decoded image data to hold.
+        """
+        self._budget = budget
+        self._entries = OrderedDict()
+        self.clear()
+
+    def clear(self):
+        """
+        Drop all entries and reset the counters.
+        """
+        self._entries.clear()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def getImage(self, path, renderParams = (), loader = None):
+        """
+        Get the decoded image for path, decoding it if necessary.
+
+        Parameters
+        ----------
+        path : str
+            Path to the image file.
+        renderParams : tuple
+            Hashable parameters which affect the decoded pixels.
+        loader : callable
+            Called with path to produce the image on a miss.  Defaults to decoding the
+            file as is.
+
+        Returns
+        -------
+        PIL.Image.Image
+            The decoded image.
+        """
+        key = (os.path.abspath(path), renderParams)
+        if key in self._entries:
+            self._hits += 1
+            # move to the most recently used end
+            entry = self._entries.pop(key)
+            self._entries[key] = entry
+            return entry[0]
+
+        self._misses += 1
+        if loader is None:
+            image = Image.open(path)
+            image.load()
+        else:
+            image = loader(path)
+        nbytes = image.size[0] * image.size[1] * len(image.getbands())
+        self._entries[key] = (image, nbytes)
+        self._size += nbytes
+        self._evict()
+        return image
+
+    def _evict(self):
+        """
+        Evict least recently used entries until the cache is within its budget.
+
+        The most recently added entry is always kept.
+        """
+        while self._size > self.budget and len(self._entries) > 1:
+            key, (image, nbytes) = self._entries.popitem(last = False)
+            self._size -= nbytes
+            self._evictions += 1
+            logging.debug('texture cache evicted '+key[0])
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            The cache counters, suitable for logging.
+        """
+        return {'hits'      : self.hits,
+                'misses'    : self.misses,
+                'evictions' : self.evictions,
+                'entries'   : len(self._entries),
+                'bytes'     : self.size}
+
+    @property
+    def budget(self):
+        return self._budget
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    @property
+    def size(self):
+        return self._size
+
+class StimPool(object):
+    """
+    Pool of stimuli shared between features.
+
+    Stimuli are keyed by their type and parameters (other than autoLog), so e.g every
+    '+' fixation cross of a run is the same TextStim and its glyphs are only rendered
+    once.  The name is part of the key so that each stimulus logs under the name it
+    was created with (e.g the rest block's cross is not logged as the fixation's).
+    Because a pooled stimulus may be used by several features at once, drawing is
+    reference counted: show() and hide() only turn autoDraw on for the first user and
+    off for the last.
+
+    Attributes
+    ----------
+    hits : int
+        Number of requests served from the pool.
+    misses : int
+        Number of requests which required a stimulus to be created.
+    """
+
+    def __init__(self):
+        """
+        Initialize an instance of StimPool.
+        """
+        self._stims = dict()
+        self._shown = dict()
+        self.clear()
+
+    def clear(self):
+        """
+        Drop all stimuli and reset the counters.
+        """
+        self._stims.clear()
+        self._shown.clear()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key(stimType, params):
+        """
+        Key identifying a stimulus.
+
+        Parameters
+        ----------
+        stimType : str
+            Name of the stimulus class.
+        params : dict
+            Keyword arguments of the stimulus.
+
+        Returns
+        -------
+        tuple
+            Hashable key of the stimulus type and its parameters.
+        """
+        items = list()
+        for name, value in sorted(params.items()):
+            if name == 'autoLog':
+                continue
+            if isinstance(value, list):
+                value = tuple(value)
+            items.append((name, value))
+        return (stimType, tuple(items))
+
+    def getStim(self, stimType, params, factory):
+        """
+        Get the stimulus for stimType and params, creating it if necessary.
+
+        Parameters
+        ----------
+        stimType : str
+            Name of the stimulus class.
+        params : dict
+            Keyword arguments of the stimulus.
+        factory : callable
+            Called with no arguments to create the stimulus on a miss.
+
+        Returns
+        -------
+        The stimulus.
+        """
+        key = self.key(stimType, params)
+        if key in self._stims:
+            self._hits += 1
+        else:
+            self._misses += 1
+            self._stims[key] = factory()
+        return self._stims[key]
+
+    def show(self, stim):
+        """
+        Start drawing a stimulus (if no other user already is).
+        """
+        count = self._shown.get(id(stim), 0)
+        if not count:
+            stim.setAutoDraw(True)
+        self._shown[id(stim)] = count + 1
+
+    def hide(self, stim):
+        """
+        Stop drawing a stimulus (if no other user still is).
+        """
+        count = self._shown.get(id(stim), 0)
+        if count <= 1:
+            self._shown.pop(id(stim), None)
+            stim.setAutoDraw(False)
+        else:
+            self._shown[id(stim)] = count - 1
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            The pool counters, suitable for logging.
+        """
+        return {'hits'    : self.hits,
+                'misses'  : self.misses,
+                'entries' : len(self._stims)}
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+textureCache = TextureCache()
+"""
+TextureCache: the cache shared by all ImageFeatures in this process
+"""
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module stores the measured refresh rate of each monitor so that the full (several
+second) measurement only needs to be repeated when a short check disagrees with it.
+"""
+import os
+import json
+import time
+import timeit
+import numpy
+from psychopy import logging
+
+import const
+
+def measureIntervals(window, frames):
+    """
+    Flip the window and measure the time between flips.
+
+    Parameters
+    ----------
+    window : visual.Window
+        The window to flip.
+    frames : int
+        Number of intervals to measure.
+
+    Returns
+    -------
+    numpy.ndarray
+        The intervals in seconds.
+    """
+    times = numpy.zeros(frames + 1)
+    window.flip()
+    for i in range(frames + 1):
+        window.flip()
+        times[i] = timeit.default_timer()
+    return numpy.diff(times)
+
+def loadProfiles(filename = const.CALIBRATION_FILE):
+    """
+    Returns
+    -------
+    dict
+        The stored profiles keyed by monitor, or an empty dict if there are none.
+    """
+    if not os.path.exists(filename):
+        return dict()
+    try:
+        with open(filename) as fh:
+            return json.load(fh)
+    except ValueError:
+        logging.warn('Calibration file '+filename+' is corrupt ... ignoring')
+        return dict()
+
+def saveProfile(key, profile, filename = const.CALIBRATION_FILE):
+    """
+    Store the profile of a monitor, keeping those of other monitors.
+    """
+    profiles = loadProfiles(filename)
+    profiles[key] = profile
+    with open(filename, 'w') as fh:
+        json.dump(profiles, fh, indent = 2, sort_keys = True)
+
+def frameRate(window, key, filename = const.CALIBRATION_FILE):
+    """
+    Find the refresh rate of a window, using the stored calibration when a short check
+    agrees with it.
+
+    Parameters
+    ----------
+    window : visual.Window
+        The window to measure.
+    key : str
+        Identifies the monitor and mode (e.g screen and resolution).
+    filename : str
+        File holding the calibrations.
+
+    Returns
+    -------
+    float
+        The refresh rate in hz, or None if a stable rate couldn't be measured.
+    """
+    profile = loadProfiles(filename).get(key)
+    if profile:
+        checked = 1.0 / numpy.median(measureIntervals(window, const.CALIBRATION_CHECK_FRAMES))
+        if abs(checked - profile['rate']) / profile['rate'] < const.CALIBRATION_TOLERANCE:
+            logging.info('Calibration for '+key+' confirmed ('+str(checked)+' hz measured)')
+            return profile['rate']
+        logging.warn('Calibration for '+key+' is out of date ('+str(checked)+' hz measured, '+
+                     str(profile['rate'])+' hz stored) ... re-measuring')
+
+    rate = window.getActualFrameRate(nIdentical=100,nMaxFrames=1000,nWarmUpFrames=100)
+    if rate:
+        intervals = measureIntervals(window, 100)
+        saveProfile(key, {'rate'      : rate,
+                          'jitter'    : float(numpy.std(intervals)),
+                          'timestamp' : time.strftime('%Y-%m-%d %H:%M:%S')}, filename)
+    return rate
@@ -69,6 +69,11 @@ DEFAULT_MODE = 'serial'
 str: default mode
 """
 
+DEFAULT_TIMING = 'frames'
+"""
+str: default timing mode ('anchored' to the clock or 'frames' to count flips)
+"""
+
 DEFAULT_PORT = '/dev/ttyACM0'
 """
 str: default port for serial device
@@ -84,6 +89,16 @@ DEFAULT_FULLSCREEN = 'true'
 str: default fullscreen status
 """
 
+DEFAULT_FRAME_TIMING = 'false'
+"""
+str: default frame timing instrumentation status
+"""
+
+DEFAULT_COMPOSITING = 'false'
+"""
+str: default status of drawing each routine's static stimuli as one pre-rendered layer
+"""
+
 DEFAULT_SCREEN_WIDTH = '1024'
 """
 str: default screen width
@@ -104,4 +119,115 @@ DEFAULT_RESULTS_FOLDER = 'data'
 str: default results folder
 """
 
+DATE_FORMAT = '%Y_%b_%d_%H%M'
+"""
+str: time.strftime format of the date in the data file names
+"""
+
 DEFAULT_FONT = 'Arial'
+
+PRELOAD_WINDOW = 3
+"""
+int: number of upcoming routines whose stimuli are kept loaded ahead of time
+"""
+
+IDLE_FRAME_BUDGET = 0.5
+"""
+float: fraction of each idle frame (e.g fixation) which may be spent on background work
+"""
+
+TEXTURE_CACHE_BUDGET = 256 * 1024 * 1024
+"""
+int: maximum number of bytes of decoded image data held by the texture cache
+"""
+
+PRERENDER_FOLDER = 'prerendered'
+"""
+str: name of the folder (within the stimuli folder) holding pre-rendered stimuli
+"""
+
+TASK_SPEC_FILE = 'task.json'
+"""
+str: name of the file (within the task folder) holding the task spec
+"""
+
+PLAN_CACHE_FOLDER = 'plans'
+"""
+str: folder holding the compiled routine plans
+"""
+
+SERIAL_READ_TIMEOUT = 0.05
+"""
+float: seconds the background serial reader blocks for before checking whether to stop
+"""
+
+FRAME_BUFFER_SIZE = 65536
+"""
+int: number of frames held by the frame timing ring buffer (about 18 minutes at 60 hz)
+"""
+
+HEADLESS_ENV = 'PSYCHOBLOCKS_HEADLESS'
+"""
+str: environment variable which, when set to 'true', runs experiments without a display
+"""
+
+HEADLESS_FRAME_RATE = 60.0
+"""
+float: simulated refresh rate (hz) of the headless window
+"""
+
+SIMULATED_TR = 2.0
+"""
+float: seconds between TLL pulses from the simulated scanner
+"""
+
+SIMULATED_LATENCY_MEAN = 0.6
+"""
+float: mean seconds from a pulse to a simulated button press
+"""
+
+SIMULATED_LATENCY_SD = 0.15
+"""
+float: standard deviation of the simulated button press latency
+"""
+
+SIMULATED_RESPONSE_RATE = 0.95
+"""
+float: probability that a simulated participant responds after each pulse
+"""
+
+DATA_QUEUE_SIZE = 10000
+"""
+int: maximum number of data records waiting to be written before addData blocks
+"""
+
+EVENT_FLIP = 256
+"""
+int: event log code for a flip of the participant window (codes below 256 are bytes
+read from the response box)
+"""
+
+EVENT_ROUTINE_START = 257
+"""
+int: event log code for the start of a routine
+"""
+
+EVENT_LOG_CHUNK = 4096
+"""
+int: number of records the event log holds in memory before writing them to disk
+"""
+
+CALIBRATION_FILE = 'calibration.json'
+"""
+str: file holding the refresh rate calibration of each monitor
+"""
+
+CALIBRATION_CHECK_FRAMES = 30
+"""
+int: number of frames flipped to check a stored calibration at startup
+"""
+
+CALIBRATION_TOLERANCE = 0.01
+"""
+float: relative difference in refresh rate above which a monitor is fully re-measured
+"""
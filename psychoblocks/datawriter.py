@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module writes experiment data as it is recorded so that an abort or crash loses
+at most the data since the last sync, rather than the whole session.
+"""
+import os
+import csv
+import atexit
+import weakref
+import threading
+import Queue
+
+import const
+
+_SYNC = object()
+_STOP = object()
+
+_openWriters = weakref.WeakSet()
+
+@atexit.register
+def _closeOpenWriters():
+    """
+    Close the writers still open at exit (e.g when aborted with core.quit()), so their
+    data is written.  Writers are tracked in a weak set, so closed writers can be
+    garbage collected.
+    """
+    for writer in list(_openWriters):
+        writer.close()
+
+class DataWriter(object):
+    """
+    Append-only replacement for psychopy's ExperimentHandler.
+
+    Each addData call becomes one (entry, name, value) row of a long format csv.  Rows
+    are handed to a writer thread through a bounded queue, so file I/O never happens on
+    the render thread.  sync() asks the writer thread to flush and fsync the file; it 
+    should be called at block boundaries.  When closed (explicitly or at exit), the long
+    file is also converted into the wide csv that ExperimentHandler used to produce.
+
+    Attributes
+    ----------
+    dataFileName : str
+        Path (without extension) of the data files.
+    """
+
+    def __init__(self, dataFileName):
+        """
+        Initialize an instance of DataWriter and start the writer thread.
+
+        Parameters
+        ----------
+        dataFileName : str
+            Path (without extension) of the data files.  Rows are written to
+            dataFileName + '_rows.csv' and the wide file to dataFileName + '.csv'.
+        """
+        self._dataFileName = dataFileName
+        self._entry = 0
+        self._closed = False
+        self._queue = Queue.Queue(maxsize = const.DATA_QUEUE_SIZE)
+
+        self._file = open(self.rowsFileName, 'w')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(['entry', 'name', 'value'])
+
+        self._thread = threading.Thread(target = self._write, name = 'DataWriter')
+        self._thread.daemon = True
+        self._thread.start()
+        _openWriters.add(self)
+
+    def _write(self):
+        """
+        Write rows from the queue until stopped.
+        """
+        while True:
+            item = self._queue.get()
+            if item is _SYNC or item is _STOP:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                if item is _STOP:
+                    break
+            else:
+                self._writer.writerow(item)
+
+    def addData(self, name, value):
+        """
+        Record a value for the current entry.
+
+        Parameters
+        ----------
+        name : str
+            Column name.
+        value
+            Value to record (converted to a string by the writer thread).
+        """
+        self._queue.put((self._entry, name, value))
+
+    def nextEntry(self):
+        """
+        Move on to the next entry (row of the wide file).
+        """
+        self._entry += 1
+
+    def sync(self):
+        """
+        Ask the writer thread to flush and fsync everything recorded so far.
+        """
+        self._queue.put(_SYNC)
+
+    def close(self):
+        """
+        Write any remaining rows, close the file, and produce the wide csv.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._file.close()
+        _openWriters.discard(self)
+        longToWide(self.rowsFileName, self.dataFileName + '.csv')
+
+    @property
+    def entry(self):
+        return self._entry
+
+    @property
+    def dataFileName(self):
+        return self._dataFileName
+
+    @property
+    def rowsFileName(self):
+        return self._dataFileName + '_rows.csv'
+
+def longToWide(longFile, wideFile):
+    """
+    Convert a long format (entry, name, value) csv into a wide csv with one row per entry.
+
+    Columns are ordered by first appearance.  When a name is recorded more than once for 
+    an entry the last value is kept, as with ExperimentHandler.
+
+    Parameters
+    ----------
+    longFile : str
+        Path of the long format csv written by DataWriter.
+    wideFile : str
+        Path of the wide csv to write.
+    """
+    columns = list()
+    entries = dict()
+    with open(longFile, 'r') as fh:
+        for row in csv.DictReader(fh):
+            if row['name'] not in columns:
+                columns.append(row['name'])
+            entries.setdefault(int(row['entry']), dict())[row['name']] = row['value']
+
+    with open(wideFile, 'w') as fh:
+        writer = csv.DictWriter(fh, fieldnames = columns)
+        writer.writeheader()
+        for entry in sorted(entries):
+            writer.writerow(entries[entry])
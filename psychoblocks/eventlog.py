@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module contains a compact binary log for high rate events (flips, pulses and
+responses) which would be too expensive to format as text in the render loop.
+
+The file is a headerless sequence of EVENT_DTYPE records.  Use readEvents or 
+scripts/convertEvents.py to turn it into a table.
+"""
+import atexit
+import csv
+import weakref
+import numpy
+
+import const
+
+EVENT_DTYPE = numpy.dtype([('code', '<u2'), ('time', '<f8'), ('trial', '<i4')])
+"""
+numpy.dtype: a record of the event log
+"""
+
+_openLogs = weakref.WeakSet()
+
+@atexit.register
+def _closeOpenLogs():
+    """
+    Close the logs still open at exit, so their buffered records are not lost
+    """
+    for eventLog in list(_openLogs):
+        eventLog.close()
+
+class EventLog(object):
+    """
+    Fixed size buffer of typed event records which is appended to a file in chunks.
+
+    Attributes
+    ----------
+    filename : str
+        Path of the binary log.
+    """
+
+    def __init__(self, filename, chunkSize = const.EVENT_LOG_CHUNK):
+        """
+        Initialize an instance of EventLog.
+
+        Parameters
+        ----------
+        filename : str
+            Path of the binary log.
+        chunkSize : int
+            Number of records held in memory before they are written.
+        """
+        self._filename = filename
+        self._buffer = numpy.zeros(chunkSize, dtype = EVENT_DTYPE)
+        self._count = 0
+        self._file = open(filename, 'wb')
+        _openLogs.add(self)
+
+    def log(self, code, time, trial):
+        """
+        Record an event.
+
+        Parameters
+        ----------
+        code : int
+            Byte read from the response box, or one of the const.EVENT_* codes.
+        time : float
+            Time of the event on the experiment clock.
+        trial : int
+            Index of the entry (trial) the event belongs to.
+        """
+        if self._file is None:
+            raise ValueError('Event log ('+self._filename+') is closed')
+        self._buffer[self._count] = (code, time, trial)
+        self._count += 1
+        if self._count == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        """
+        Write any buffered records to the file.
+        """
+        if self._file is None:
+            self._count = 0
+            return
+        self._buffer[:self._count].tofile(self._file)
+        self._file.flush()
+        self._count = 0
+
+    def close(self):
+        """
+        Write any buffered records and close the file.
+        """
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+        _openLogs.discard(self)
+
+    @property
+    def filename(self):
+        return self._filename
+
+def readEvents(filename):
+    """
+    Read an event log.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the binary log.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of EVENT_DTYPE records; columns can be accessed by name (e.g events['time']).
+    """
+    return numpy.fromfile(filename, dtype = EVENT_DTYPE)
+
+def eventName(code):
+    """
+    Human readable name for an event code.
+    """
+    if code == const.EVENT_FLIP:
+        return 'flip'
+    if code == const.EVENT_ROUTINE_START:
+        return 'routine'
+    if code == const.TLL_PULSE:
+        return 'pulse'
+    return 'button'
+
+def toCSV(filename, csvFile):
+    """
+    Convert an event log into a csv with code, name, time and trial columns.
+    """
+    events = readEvents(filename)
+    with open(csvFile, 'w') as fh:
+        writer = csv.writer(fh)
+        writer.writerow(['code', 'name', 'time', 'trial'])
+        for code, time, trial in events:
+            writer.writerow([code, eventName(code), repr(float(time)), trial])
+
+def toColumns(filename, npzFile):
+    """
+    Convert an event log into a columnar numpy archive with one array per column.
+    """
+    events = readEvents(filename)
+    numpy.savez(npzFile, **dict((name, events[name]) for name in EVENT_DTYPE.names))
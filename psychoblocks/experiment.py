@@ -7,10 +7,52 @@
 # Python Version:   2.7.5
 ###############################################################################
 import os
-import serial
-from psychopy import core, gui, data, logging, visual, clock
+import time
+import itertools
+from collections import deque
+from psychopy import core, logging, clock
 
 import const
+import startup
+from preload import Preloader, IdleScheduler
+from inputs import InputDispatcher
+from cache import textureCache, StimPool
+from serialreader import SerialReader
+from instrumentation import FrameTimer
+from headless import SimulatedClock, NullWindow, NullStim
+from simulation import SimulatedResponseDevice, PtyResponseDevice
+from datawriter import DataWriter
+from eventlog import EventLog
+import calibration
+
+def defaultInfo(name):
+    """
+    The default experiment parameters for a task.
+
+    Parameters
+    ----------
+    name : str
+        Name of the experiment task
+
+    Returns
+    -------
+    dict
+        The parameters, as shown in the dialog
+    """
+    return {'participant'       : const.DEFAULT_PARTICIPANT,
+            'session'           : const.DEFAULT_SESSION,
+            'run file'          : os.path.join(name,'runs',const.DEFAULT_RUN_FILE),
+            'mode'              : const.DEFAULT_MODE,
+            'timing'            : const.DEFAULT_TIMING,
+            'port'              : const.DEFAULT_PORT,
+            'baudrate'          : const.DEFAULT_BAUDRATE,
+            'fullscreen'        : const.DEFAULT_FULLSCREEN,
+            'frame timing'      : const.DEFAULT_FRAME_TIMING,
+            'compositing'       : const.DEFAULT_COMPOSITING,
+            'screen height'     : const.DEFAULT_SCREEN_HEIGHT,
+            'screen width'      : const.DEFAULT_SCREEN_WIDTH,
+            'stimuli folder'    : const.DEFAULT_STIMULI_FOLDER,
+            'results folder'    : os.path.join(name,const.DEFAULT_RESULTS_FOLDER)}
 
 class Experiment(object):
     """
@@ -30,52 +72,106 @@ class Experiment(object):
         setup the experiment
     participantWindow : visual.Window
         The window displayed to the participant during the experiment 
-    expHandler : data.ExperimentHandler
-        Experiment Handler uesd to write the data file for this experiment
+    expHandler : DataWriter
+        Writer used to write the data file for this experiment as it is recorded
+    eventLog : EventLog
+        Binary log of flips, pulses and responses
     responseBox: serial.Serial
         Serial object used for reading data from the response box
+    responseDevice: AbstractResponseDevice
+        Source of timestamped response box events (a SerialReader in serial mode, a
+        SimulatedResponseDevice in simulated mode and a PtyResponseDevice in pty mode)
     clock: clock.Clock
         clock from the core module used for keeping track of time
+        (a SimulatedClock when headless)
+    headless: bool
+        Whether the experiment is running without a display
+    frameTimer: FrameTimer
+        Records frame timing if 'frame timing' is enabled, None otherwise
+    inputs: InputDispatcher
+        Reads the keyboard and response device once per frame for subscribed features
+    idleScheduler: IdleScheduler
+        Carries out background work (e.g preloading) in the idle time of loops
+    stimPool: StimPool
+        Pool of stimuli shared between features (e.g identical text stimuli)
     routines: list
-        list of Routine objects to be called over the course of the experiment
+        list of Routine objects and iterables (e.g generators) of Routine objects to be 
+        called over the course of the experiment
     """
 
-    def __init__(self,name):
+    def __init__(self,name,headless = None,info = None,interactive = True):
         """
         Initialization...
+
+        Parameters
+        ----------
+        name : str
+            Name of this experiment task
+        headless : bool
+            Run without a display, using the default settings and a simulated clock.
+            If None, this is read from the const.HEADLESS_ENV environment variable.
+        info : dict
+            Values overriding the defaults for the experiment parameters (e.g 
+            {'results folder' : 'tmp'}).
+        interactive : bool
+            Show the dialog to confirm the parameters.  It is never shown when headless.
         """
+        if headless is None:
+            headless = os.environ.get(const.HEADLESS_ENV, 'false') == 'true'
+        self._headless = headless
+        self._interactive = interactive and not headless
 
-        self._getInfo(name)
-        self._clock = clock.Clock()
-        self._setupLogfile()
+        self._getInfo(name, info)
+        startup.mark('parameters')
+        if self.headless:
+            self._clock = SimulatedClock()
+        else:
+            self._clock = clock.Clock()
+        # the startup is logged per session, since the participant and run are only known
+        # once a run starts (each run then logs to its own file)
+        self._setupLogfile(os.path.join(self.resultsFolder, '%s_%s_startup.log' %
+                                        (self.expName, self.date)))
         self._setupWindows()
         self._setupResponseBox()
-        self._setupExperimentHandler()
+        self._inputs = InputDispatcher(self.clock, keyboard = not self.headless)
+        self._inputs.setDevice(self.responseDevice)
+        startup.mark('response box')
+        # the data files are opened when first used, so that each run gets its own
+        self._expHandler = None
+        self._eventLog = None
+        self._frameTimer = None
+        self._dataFile = None
+        self._runCount = 0
         self._routines = list()
+        self._preloader = Preloader()
+        self._idleScheduler = IdleScheduler(self.clock)
+        self._idleScheduler.addSource(self._preloader.service)
+        self._stimPool = StimPool()
 
-    def _getInfo(self,name):
+    def _getInfo(self,name,info = None):
         """
         Get the required information to initialize this task
         """
         # get some basic information for the experiment
         self._expName = name
-        expInfo = {'participant'       : const.DEFAULT_PARTICIPANT,
-                        'session'           : const.DEFAULT_SESSION,
-                        'run file'          : os.path.join(name,'runs',const.DEFAULT_RUN_FILE),
-                        'mode'              : const.DEFAULT_MODE,
-                        'port'              : const.DEFAULT_PORT,
-                        'baudrate'          : const.DEFAULT_BAUDRATE,
-                        'fullscreen'        : const.DEFAULT_FULLSCREEN,
-                        'screen height'     : const.DEFAULT_SCREEN_HEIGHT,
-                        'screen width'      : const.DEFAULT_SCREEN_WIDTH,
-                        'stimuli folder'    : const.DEFAULT_STIMULI_FOLDER,
-                        'results folder'    : os.path.join(name,const.DEFAULT_RESULTS_FOLDER)} 
-        dlg = gui.DlgFromDict(dictionary = expInfo, title = self.expName)
-        if dlg.OK == False:
-            logging.error("Couldn't establish experiment parameters")
-            core.quit()
+        expInfo = defaultInfo(name)
+        if self.headless:
+            # there is no display for the dialog, and nothing to talk to over serial
+            expInfo['mode'] = 'simulated'
+            expInfo['fullscreen'] = 'false'
+        if info:
+            expInfo.update(info)
+        if self.interactive:
+            # the gui module is slow to import, so only import it when it's needed
+            from psychopy import gui
+            dlg = gui.DlgFromDict(dictionary = expInfo, title = self.expName)
+            if dlg.OK == False:
+                logging.error("Couldn't establish experiment parameters")
+                core.quit()
 
-        self._date = data.getDateStr()
+        # the format of psychopy.data.getDateStr, without importing psychopy.data (and
+        # the analysis packages it pulls in) just for the date
+        self._date = time.strftime(const.DATE_FORMAT)
 
         self._participant = expInfo['participant']
         self._session = expInfo['session']
@@ -110,11 +206,34 @@ class Experiment(object):
             logging.warn('fullscreen should either be true or false ... defaulting to false')
             self._fullscreen = 'false'
 
-        # mode should be 'serial' or 'test'
+        # frame timing should be 'true' or 'false'
+        self._frameTiming = expInfo['frame timing']
+        if self.frameTiming != 'true' and self.frameTiming != 'false':
+            logging.warn('frame timing should either be true or false ... defaulting to false')
+            self._frameTiming = 'false'
+
+        # compositing should be 'true' or 'false'
+        self._compositing = expInfo['compositing']
+        if self.compositing != 'true' and self.compositing != 'false':
+            logging.warn('compositing should either be true or false ... defaulting to false')
+            self._compositing = 'false'
+
+        # mode should be 'serial', 'simulated', 'pty' or 'test'
         self._mode = expInfo['mode']
-        if self.mode != 'serial' and self.mode != 'test':
+        if self.mode not in ('serial', 'simulated', 'pty', 'test'):
             logging.warn('unrecognized mode ... defaulting to false'+self.mode)
             self._mode = 'test'
+        if self.mode == 'pty' and self.headless:
+            logging.warn('pty mode needs the real clock ... defaulting to simulated')
+            self._mode = 'simulated'
+
+        # timing should be 'anchored' or 'frames'
+        self._timing = expInfo['timing']
+        if self.timing != 'anchored' and self.timing != 'frames':
+            logging.warn('unrecognized timing ('+self.timing+') ... defaulting to frames')
+            self._timing = 'frames'
+        self._nextOnset = None
+        self._lastOnset = None
 
         # baudrate should be an integer
         try:
@@ -152,10 +271,12 @@ class Experiment(object):
 
         Note
         ----
-        self.responseBox = None if the experiment isn't using it
+        self.responseBox = None if the experiment isn't using the serial port, and
+        self.responseDevice = None in test mode
         """
         # setup the response box if there is one
         if (self.mode == 'serial'):
+            import serial
             try:
                 self._responseBox = serial.Serial(port = self.port,
                                         baudrate = self.baudrate,
@@ -163,19 +284,33 @@ class Experiment(object):
             except serial.SerialException:
                 logging.error("Couldn't connect to responsebox at "+self.port)
                 core.quit()
+            self._responseDevice = SerialReader(self.responseBox, self.clock)
+        elif (self.mode == 'simulated'):
+            self._responseBox = None
+            self._responseDevice = SimulatedResponseDevice(self.clock)
+        elif (self.mode == 'pty'):
+            # simulated bytes read back through a SerialReader (needs the real clock)
+            self._responseBox = None
+            self._responseDevice = PtyResponseDevice(self.clock)
         else:
             self._responseBox = None
+            self._responseDevice = None
 
-    def _setupLogfile(self):
-        """
-        Setup the logfile
+    def _setupLogfile(self, logfile):
         """
+        Setup the logfile, replacing the current one
 
-        # setup logging -- do we need to hold onto the returns?
-        datafile = os.path.join(self.resultsFolder,'%s_%s_%s' %
-                               (self.participant, self.session, self.date))
-
-        self._logfile = logging.LogFile(datafile+'.log', level = logging.INFO)
+        Parameters
+        ----------
+        logfile : str
+            Path of the logfile.
+        """
+        if getattr(self, '_logfile', None) is not None:
+            if self._logfileName == logfile:
+                return
+            logging.root.removeTarget(self._logfile)
+        self._logfile = logging.LogFile(logfile, level = logging.INFO)
+        self._logfileName = logfile
         logging.console.setLevel(logging.WARNING)
 
     def _setupWindows(self):
@@ -191,53 +326,269 @@ class Experiment(object):
         height = self.screenHeight
         width  = self.screenWidth
 
-        self._participantWindow = visual.Window(size = [width,height],
-                                              fullscr = screenFlag,
-                                              screen = 1,
-                                              allowGUI = True,
-                                              allowStencil = False,
-                                              monitor = 'particpant',
-                                              color = [-1,-1,-1],
-                                              colorSpace = 'rgb',
-                                              blendMode = 'avg',
-                                              useFBO = False,
-                                              waitBlanking = True)
-
-        self._participantFrameRate = self.participantWindow.getActualFrameRate(nIdentical=100,nMaxFrames=1000,nWarmUpFrames=100)
+        if self.headless:
+            self._participantWindow = NullWindow(size = [width,height],
+                                                 frameRate = const.HEADLESS_FRAME_RATE,
+                                                 clock = self.clock)
+        else:
+            from psychopy import visual
+            self._participantWindow = visual.Window(size = [width,height],
+                                                  fullscr = screenFlag,
+                                                  screen = 1,
+                                                  allowGUI = True,
+                                                  allowStencil = False,
+                                                  monitor = 'particpant',
+                                                  color = [-1,-1,-1],
+                                                  colorSpace = 'rgb',
+                                                  blendMode = 'avg',
+                                                  useFBO = False,
+                                                  waitBlanking = True)
+        startup.mark('window')
+
+        if self.headless:
+            self._participantFrameRate = self.participantWindow.getActualFrameRate()
+        else:
+            # only re-measure the frame rate if it doesn't match the stored calibration
+            monitor = 'screen 1 %dx%d %s' % (width, height, 
+                                             'fullscreen' if screenFlag else 'windowed')
+            self._participantFrameRate = calibration.frameRate(self.participantWindow, monitor)
         if self.participantFrameRate:
             logging.info('Particpant screen has a framerate of '+str(self.participantFrameRate)+" hz")
         else:
             logging.error("Couldn't establish a stable frame rate for particpant screen")
             core.quit()
+        startup.mark('frame rate probe')
+
+    def _dataFileBase(self):
+        """
+        Path (without extension) of the data files of the current run
+        """
+        runName = os.path.splitext(os.path.basename(self.runFile))[0]
+        return os.path.join(self.resultsFolder, '%s_%s_%s_%s' %
+                            (self.participant, self.session, runName, self.date))
 
     def _setupExperimentHandler(self):
         """
-        Setup the experiment handler
+        Setup the experiment handler, event log, frame timer and logfile for the current run
+        """
+        # never overwrite the files of an earlier run (e.g the same run repeated)
+        base = self._dataFileBase()
+        self._dataFile = base
+        index = 1
+        while (os.path.exists(self._dataFile+'_rows.csv') or 
+               os.path.exists(self._dataFile+'_events.bin')):
+            index += 1
+            self._dataFile = '%s_%d' % (base, index)
+        self._setupLogfile(self.dataFile+'.log')
+
+        self._expHandler = DataWriter(self.dataFile)
+        self._eventLog = EventLog(self.dataFile+'_events.bin')
+        if self.frameTiming == 'true':
+            self._frameTimer = FrameTimer(self.clock, self.participantFrameRate)
+        else:
+            self._frameTimer = None
+
+    def _closeExperimentHandler(self):
+        """
+        Close the data files of the current run, if they were opened
         """
+        if self._expHandler is None:
+            return
+        # detached first, so nothing (e.g flip) writes to them once they are closed
+        expHandler, eventLog, frameTimer = self._expHandler, self._eventLog, self._frameTimer
+        self._expHandler = None
+        self._eventLog = None
+        self._frameTimer = None
+        expHandler.close()
+        eventLog.close()
+        if frameTimer:
+            frameTimer.save(self.dataFile+'_frames.csv')
 
-        datafile = os.path.join(self.resultsFolder, '%s_%s_%s' %
-                               (self.participant, self.session, self.date))
+    def startRun(self, runFile, participant = None):
+        """
+        Set the run (and participant) that the next call to run() records data for.
+
+        The window, response box, stimulus cache and calibration are kept, so several runs
+        can be carried out in one process.  Any data files still open are closed.
 
-        self._expHandler = data.ExperimentHandler(name = self.expName, 
-                                                 version = self.runFile,
-                                                 #extraInfo = self.expInfo,
-                                                 runtimeInfo = None,
-                                                 originPath = None,
-                                                 savePickle = False,
-                                                 saveWideText = True,
-                                                 dataFileName = datafile)
+        Parameters
+        ----------
+        runFile : str
+            Path of the run file.
+        participant : str
+            Participant the run is for.  Defaults to the current participant.
+        """
+        if not os.path.exists(runFile):
+            logging.error("Couldn't find runfile ("+runFile+")")
+            core.quit()
+        self._closeExperimentHandler()
+        self._runFile = runFile
+        if participant is not None:
+            self._participant = participant
+        self._nextOnset = None
+        self._lastOnset = None
     
+    def scheduleOnset(self, onset):
+        """
+        Set the time at which the next anchored TimedLoop should begin.
+
+        Parameters
+        ----------
+        onset : float
+            Time on self.clock, or None to anchor the next loop to its first flip.
+        """
+        self._nextOnset = onset
+
+    def markOnset(self, onset):
+        """
+        Record the flip at which the stimuli of the current TimedLoop appeared, so that
+        features can time responses relative to it.
+
+        Parameters
+        ----------
+        onset : float
+            Time on self.clock of the first flip of the loop.
+        """
+        self._lastOnset = onset
+
+    def setResponseDevice(self, device):
+        """
+        Replace the response device (e.g with a scripted SimulatedResponseDevice).
+
+        Parameters
+        ----------
+        device : AbstractResponseDevice
+            The new device, or None to run without one.
+        """
+        if self.responseDevice is not None:
+            self.responseDevice.stop()
+        self._responseDevice = device
+        self.inputs.setDevice(device)
+
+    def createStim(self, stimType, shared = False, **params):
+        """
+        Create a stimulus for the participant window.
+
+        Parameters
+        ----------
+        stimType : str
+            Name of the psychopy.visual stimulus class (e.g 'TextStim').  A name is used
+            so that psychopy.visual is only imported when a real window is in use.
+        shared : bool
+            Whether to reuse an identical stimulus from the stimulus pool.  Shared
+            stimuli must be drawn through stimPool.show() and stimPool.hide().
+        params
+            Keyword arguments passed to the stimulus.
+
+        Returns
+        -------
+        The stimulus, or a NullStim when headless.
+        """
+        if shared:
+            return self.stimPool.getStim(stimType, params,
+                                         lambda: self.createStim(stimType, **params))
+        if self.headless:
+            return NullStim(**params)
+        from psychopy import visual
+        return getattr(visual, stimType)(self.participantWindow, **params)
+
+    def flip(self):
+        """
+        Flip the participant window, recording the flip if frame timing is enabled, and
+        pump the input sources once for the new frame.
+
+        Returns
+        -------
+        float
+            Time on self.clock immediately after the flip.
+        """
+        self.participantWindow.flip()
+        flipTime = self.clock.getTime()
+        # flips between runs (when no data files are open) are not logged
+        if self._eventLog is not None:
+            self._eventLog.log(const.EVENT_FLIP, flipTime, self._expHandler.entry)
+        if self.frameTimer:
+            self.frameTimer.recordFlip(flipTime)
+        self.inputs.pump()
+        return flipTime
+
     def addRoutine(self,routine):
-        self._routines.append(routine)
+        if self._routines and isinstance(self._routines[-1], list):
+            self._routines[-1].append(routine)
+        else:
+            self._routines.append([routine])
+
+    def addRoutines(self,routines):
+        """
+        Add an iterable of routines to be run in order.
 
-    def run(self):
-        # reverse our list because I'm too lazy to use a proper queue
-        self._routines.reverse()
-        while(len(self._routines)):
-            currRoutine = self._routines.pop()
+        The iterable is not consumed until the experiment is run, so passing a generator 
+        means each routine is only built shortly before it is needed.
+
+        Parameters
+        ----------
+        routines : iterable
+            The routines (e.g a generator yielding them).
+        """
+        self._routines.append(routines)
+
+    def clearRoutines(self):
+        """
+        Discard any routines which have been added but not run.
+        """
+        self._routines = list()
+
+    def run(self, lookahead = const.PRELOAD_WINDOW):
+        """
+        Run the routines in order.
+
+        Parameters
+        ----------
+        lookahead : int
+            Number of routines to build ahead of the current one.  These are the routines
+            the preloader is able to prepare.
+        """
+        if self._expHandler is None:
+            self._setupExperimentHandler()
+        self.idleScheduler.resetStats()
+        routines = itertools.chain.from_iterable(self._routines)
+        self._routines = list()
+        upcoming = deque(itertools.islice(routines, lookahead + 1))
+        if self._runCount == 0:
+            startup.mark('routine build')
+            logging.info('startup times:\n'+startup.report())
+        self._runCount += 1
+        while(len(upcoming)):
+            currRoutine = upcoming.popleft()
+            upcoming.extend(itertools.islice(routines, lookahead + 1 - len(upcoming)))
+            # make sure the current routine is ready and queue up the next few
+            self.preloader.prepare(currRoutine)
+            self.preloader.schedule(list(upcoming))
             logging.info('starting routine '+type(currRoutine).__name__+' ...')
+            self.eventLog.log(const.EVENT_ROUTINE_START, self.clock.getTime(),
+                              self.experimentHandler.entry)
+            if self.frameTimer:
+                self.frameTimer.startRoutine(type(currRoutine).__name__)
             currRoutine.run()
+            if self.frameTimer:
+                self.frameTimer.endRoutine()
             logging.info('finished routine '+type(currRoutine).__name__+' ...')
+            self.preloader.release(currRoutine)
+        logging.info('texture cache: '+str(textureCache.stats()))
+        logging.info('stimulus pool: '+str(self.stimPool.stats()))
+        logging.info('idle scheduler: '+str(self.idleScheduler.stats()))
+        if isinstance(self.responseDevice, PtyResponseDevice):
+            logging.info('response box latency: '+str(self.responseDevice.stats()))
+        self._closeExperimentHandler()
+
+    @property
+    def headless(self):
+        return self._headless
+
+    @property
+    def interactive(self):
+        return self._interactive
+
     @property
     def expName(self):
         return self._expName 
@@ -258,6 +609,18 @@ class Experiment(object):
     def mode(self):
         return self._mode 
           
+    @property
+    def timing(self):
+        return self._timing 
+
+    @property
+    def nextOnset(self):
+        return self._nextOnset
+
+    @property
+    def lastOnset(self):
+        return self._lastOnset
+
     @property
     def port(self):
         return self._port 
@@ -270,6 +633,14 @@ class Experiment(object):
     def fullscreen(self):
         return self._fullscreen 
     
+    @property
+    def frameTiming(self):
+        return self._frameTiming 
+
+    @property
+    def compositing(self):
+        return self._compositing
+
     @property
     def screenHeight(self):
         return self._screenHeight 
@@ -294,6 +665,18 @@ class Experiment(object):
     def responseBox(self):
         return self._responseBox 
  
+    @property
+    def responseDevice(self):
+        return self._responseDevice
+ 
+    @property
+    def stimPool(self):
+        return self._stimPool
+ 
+    @property
+    def dataFile(self):
+        return self._dataFile
+ 
     @property
     def logfile(self):
         return self._logfile 
@@ -308,8 +691,33 @@ class Experiment(object):
  
     @property
     def experimentHandler(self):
+        # opened on first use, so features can record data before run() (e.g benchmarks)
+        if self._expHandler is None:
+            self._setupExperimentHandler()
         return self._expHandler
 
+    @property
+    def eventLog(self):
+        if self._eventLog is None:
+            self._setupExperimentHandler()
+        return self._eventLog
+
     @property
     def clock(self):
         return self._clock
+
+    @property
+    def frameTimer(self):
+        return self._frameTimer
+
+    @property
+    def preloader(self):
+        return self._preloader
+
+    @property
+    def idleScheduler(self):
+        return self._idleScheduler
+
+    @property
+    def inputs(self):
+        return self._inputs
@@ -5,17 +5,26 @@
 # PyschoPy Version: 1.85.3
 # Python Version:   2.7.5
 ###############################################################################
-from psychopy import core, visual, event, logging
+from psychopy import core, logging
 from abc import ABCMeta, abstractmethod
 import const
 from abstracts import *
+from cache import textureCache
+import prerender
 
 class TimedLoop(AbstractLoop):
     """
     This will run the contained features for the specified amount of time, refreshing the
     screen with each pass.
+
+    When the experiment's timing is 'anchored', the loop is scheduled against the clock
+    rather than by counting frames: it begins at the experiment's next scheduled onset
+    (the end of the previous loop, or the last sync pulse) and ends on the flip nearest
+    onset + duration, so dropped frames do not accumulate into drift.  Otherwise (the
+    default) the loop simply shows int(frame rate * duration) frames.  Dropped frames are
+    counted in both modes.
     """
-    def __init__(self, origin, duration, experiment = None):
+    def __init__(self, origin, duration, experiment = None, record = False, idle = False):
         """
         Initialize an instance of TimedLoop.
 
@@ -27,10 +36,22 @@ class TimedLoop(AbstractLoop):
             Feature being decorated.  None if this is the base.
         experiment : Experiment
             Experiment to which this belongs.  Not necessary if this is not the base.
+        record : bool
+            Whether to add the dropped frames (and onset error, if anchored) to the
+            experiment data.
+            Only trials should do this, otherwise the values will overwrite each other.
+        idle : bool
+            Whether the loop has time to spare (e.g fixation).  If so, the experiment's
+            idle scheduler is given const.IDLE_FRAME_BUDGET of every frame for background
+            work such as preparing the next routine.
         """
         super(TimedLoop,self).__init__(origin, experiment = experiment)
 
+        self._duration = duration
         self._framesToShow = int(self.experiment.participantFrameRate * duration)
+        self._record = record
+        self._idle = idle
+        self._idleBudget = const.IDLE_FRAME_BUDGET / self.experiment.participantFrameRate
 
         self._status = False
 
@@ -47,21 +68,72 @@ class TimedLoop(AbstractLoop):
         """
         self._framesShown = 0
         self._status = True
+        # the onset is marked on the first flip
+        self.experiment.markOnset(None)
+        self._onset = None
+        self._lastFlip = None
+        self._droppedFrames = 0
 
     def updateStatus(self):
         """
         Check whether the correct number of frames have been shown for the requested duration.
         """
-        self.experiment.participantWindow.flip()
+        flipTime = self.experiment.flip()
         self._framesShown += 1
-        if self._framesShown >= self._framesToShow:
+        if self._framesShown == 1:
+            self.experiment.markOnset(flipTime)
+        else:
+            self._countDropped(flipTime)
+        self._lastFlip = flipTime
+        if self.experiment.timing == 'anchored':
+            self._updateAnchored(flipTime)
+        elif self._framesShown >= self._framesToShow:
+            self._status = False
+        if self._idle and self._status:
+            self.experiment.idleScheduler.service(self._idleBudget)
+
+    def _countDropped(self, now):
+        """
+        Count the frames dropped since the previous flip.
+        """
+        frameDuration = 1.0 / self.experiment.participantFrameRate
+        interval = now - self._lastFlip
+        if interval > 1.5 * frameDuration:
+            self._droppedFrames += int(round(interval / frameDuration)) - 1
+
+    def _updateAnchored(self, now):
+        """
+        Check whether the next flip is the one nearest the target end.
+        """
+        frameDuration = 1.0 / self.experiment.participantFrameRate
+        if self._onset is None:
+            # the first flip is the onset
+            self._onset = now
+            target = self.experiment.nextOnset
+            if target is None:
+                target = now
+            self._onsetError = now - target
+            self._targetEnd = target + self._duration
+            self.experiment.scheduleOnset(self._targetEnd)
+        # the current frame stays up until the next flip
+        if now + 1.5 * frameDuration >= self._targetEnd:
             self._status = False
 
     def destroyLoop(self):
         """
-        Does nothing.
+        Log the timing of the loop (the onset error is only known if it was anchored).
         """
-        pass
+        if self._lastFlip is None:
+            return
+        if self._onset is not None:
+            logging.info('timed loop onset error '+str(self._onsetError)+' s, '+
+                         str(self._droppedFrames)+' dropped frames')
+        else:
+            logging.info('timed loop '+str(self._droppedFrames)+' dropped frames')
+        if self._record:
+            if self._onset is not None:
+                self.experiment.experimentHandler.addData('onsetError',self._onsetError)
+            self.experiment.experimentHandler.addData('droppedFrames',self._droppedFrames)
 
 class SpacebarLoop(AbstractLoop):
     """
@@ -91,23 +163,30 @@ class SpacebarLoop(AbstractLoop):
 
     def initializeLoop(self):
         """
-        Initialize status.
+        Initialize status and subscribe to the spacebar.
         """
         self._status = True
+        self.experiment.inputs.subscribe('keyboard', self._spacePressed, keys = ['space'])
+
+    def _spacePressed(self, event):
+        self._status = False
 
     def updateStatus(self):
         """
-        Check for spacebar keypress.
+        Flip the window, which pumps the keyboard.
         """
-        self.experiment.participantWindow.flip()
-        if 'space' in event.getKeys(keyList = ['space']):
+        self.experiment.flip()
+        # nobody is there to press space when running headless
+        if self.experiment.headless:
             self._status = False
 
     def destroyLoop(self):
         """
-        Does nothing.
+        Unsubscribe from the spacebar, and anchor the next timed loop to its own onset, 
+        since this loop has no fixed duration.
         """
-        pass
+        self.experiment.inputs.unsubscribe('keyboard', self._spacePressed)
+        self.experiment.scheduleOnset(None)
 
 class MRISync(AbstractFeature):
     """
@@ -127,25 +206,43 @@ class MRISync(AbstractFeature):
         """
         super(MRISync,self).__init__(origin,experiment = experiment)
 
-    def start(self):
-        """
-        Halt execution until TLL pulse is read
-        """
-        # run the origin features first
-        super(MRISync,self).start() 
-        # wait for TLL pulse until being allowed to continue
-        self.experiment.responseBox.reset_input_buffer()
-        pulseSeen = False
-        while(not pulseSeen):
-            data = self.experiment.responseBox.read()
-            if data and ord(data) == const.TLL_PULSE:
-                timestamp = str(self.experiment.clock.getTime())
-                self.experiment.experimentHandler.addData('syncPulse',timestamp)
-                pulseSeen = True
+    def afterStart(self):
+        """
+        Halt execution until TLL pulse is read.  This happens after the origin features 
+        have been started.
+        """
+        if self.experiment.responseDevice is None:
+            logging.warn('no response box ... not waiting for sync pulse')
+            return
+        # wait for TLL pulse until being allowed to continue.  This sleeps until the
+        # reader thread sees data rather than spinning on the port.
+        self.experiment.responseDevice.reset()
+        waitStart = self.experiment.clock.getTime()
+        event = self.experiment.responseDevice.waitFor(const.TLL_PULSE)
+        if event is None:
+            logging.error('Response box stopped while waiting for sync pulse ... aborting')
+            core.quit()
+        waited = event.timestamp - waitStart
+        self.experiment.eventLog.log(event.code, event.timestamp, 
+                                     self.experiment.experimentHandler.entry)
+        self.experiment.experimentHandler.addData('syncPulse',event.timestamp)
+        self.experiment.experimentHandler.addData('syncWait',waited)
+        # lock the schedule to the scanner
+        self.experiment.scheduleOnset(event.timestamp)
+        logging.info('sync pulse after waiting '+str(waited)+' s')
 
 class ResponseBox(AbstractFeature):
     """
-    Checks the response box for the first reponse.
+    Records the responses made while the decorated features are shown.
+
+    Responses are collected from the experiment's input dispatcher, which reads the
+    response device's event stream (timestamped by the device as they arrive).  The
+    first response at or after the onset of the enclosing TimedLoop (its first flip) is
+    latched as the response of the trial; later responses only appear in the list of
+    all responses.  Reaction times are relative to that onset.
+
+    Recorded data: response, rt, correct (1 or 0, if the correct response is known),
+    onset, nResponses, and the space separated allResponses and allRTs.
     """
 
     def __init__(self, origin, correctResponse, experiment = None):
@@ -165,30 +262,52 @@ class ResponseBox(AbstractFeature):
 
         self._correctResponse = correctResponse
         
-    def start(self):
-        """
-        Set flags and clear the input buffer
-        """
-        self._responseRead = False
-        # clear the buffer
-        self.experiment.responseBox.reset_input_buffer()
-        # call origin feature
-        super(ResponseBox,self).start()
-
-    def run(self):
-        data = self.experiment.responseBox.read(size=1)
-        while(data and ord(data) == const.TLL_PULSE):
-            data = self.experiment.responseBox.read(size=1)
-        if data:
-            self._responseRead = True
-            timestamp = str(self.experiment.clock.getTime())
-            correct = data == self._correctResponse
-            self.experiment.experimentHandler.addData('response',data)
-            self.experiment.experimentHandler.addData('timestamp',timestamp)
-            self.experiment.experimentHandler.addData('correct',correct)
-            logging.data('Response Box: '+data)
-        # call origin feature
-        super(ResponseBox,self).run()
+    def startFeature(self):
+        """
+        Clear the input buffer and subscribe to the response box
+        """
+        if self.experiment.responseDevice is not None:
+            self.experiment.responseDevice.reset()
+        self._events = list()
+        self.experiment.inputs.subscribe('serial', self._collect)
+
+    def _collect(self, event):
+        self._events.append(event)
+
+    def endFeature(self):
+        """
+        Collect the responses made since the feature started and record them
+        """
+        # pick up anything which arrived since the last flip
+        self.experiment.inputs.pump()
+        self.experiment.inputs.unsubscribe('serial', self._collect)
+        expHandler = self.experiment.experimentHandler
+        responses = list()
+        for event in self._events:
+            self.experiment.eventLog.log(event.key, event.timestamp, expHandler.entry)
+            if event.key != const.TLL_PULSE:
+                responses.append(event)
+        self._events = list()
+
+        onset = self.experiment.lastOnset
+        expHandler.addData('nResponses', len(responses))
+        if onset is None:
+            logging.warn('no onset for responses ... only recording their number')
+            return
+        expHandler.addData('onset', onset)
+        rts = [event.timestamp - onset for event in responses]
+        expHandler.addData('allResponses', ' '.join(chr(event.key) for event in responses))
+        expHandler.addData('allRTs', ' '.join('%.6f' % rt for rt in rts))
+
+        # the first response after the onset is the response to the trial
+        for event, rt in zip(responses, rts):
+            if rt >= 0:
+                data = chr(event.key)
+                expHandler.addData('response', data)
+                expHandler.addData('rt', rt)
+                if self._correctResponse is not None:
+                    expHandler.addData('correct', int(data == str(self._correctResponse)))
+                break
 
 class EscapeCheck(AbstractFeature):
     """
@@ -208,15 +327,20 @@ class EscapeCheck(AbstractFeature):
         """
         super(EscapeCheck,self).__init__(origin,experiment = experiment)
 
-    def run(self):
-        if 'escape' in event.getKeys(keyList = ['escape']):
-            logging.warn('escape button pressed ... aborting experiment')
-            core.quit()
-        super(EscapeCheck,self).run()
+    def startFeature(self):
+        self.experiment.inputs.subscribe('keyboard', self._escapePressed, keys = ['escape'])
+
+    def endFeature(self):
+        self.experiment.inputs.unsubscribe('keyboard', self._escapePressed)
+
+    def _escapePressed(self, event):
+        logging.warn('escape button pressed ... aborting experiment')
+        core.quit()
 
 class TextFeature(AbstractFeature):
     """
-    Wrapper around psychopy.TextStim
+    Wrapper around psychopy.TextStim.  Identical text stimuli are shared through the
+    experiment's stimulus pool, so e.g a run's fixation crosses are only rendered once.
     """
     
     def __init__(self, origin, experiment = None, text='Hello World', font=const.DEFAULT_FONT, 
@@ -241,21 +365,37 @@ class TextFeature(AbstractFeature):
         """
 
         super(TextFeature,self).__init__(origin, experiment = experiment)
-        self._textStim = visual.TextStim(self.experiment.participantWindow, text=text, 
+        self._textStim = self.experiment.createStim('TextStim', shared=True, text=text, 
                                 font=font, pos=pos, depth=depth, rgb=rgb, color=color, 
                                 colorSpace=colorSpace, opacity=opacity, contrast=contrast, 
                                 units=units, ori=ori, height=height, antialias=antialias, 
                                 bold=bold, italic=italic, alignHoriz=alignHoriz, 
                                 alignVert=alignVert, fontFiles=fontFiles, wrapWidth=wrapWidth, 
                                 flipHoriz=flipHoriz, flipVert=flipVert, name=name, autoLog=autoLog)
+        self._composited = False
+
+    def layerStim(self):
+        """
+        Returns
+        -------
+        TextStim
+            The stimulus, for drawing into a composite (see CompositeFeature).
+        """
+        return self._textStim
+
+    def setComposited(self, composited):
+        """
+        Set whether the stimulus is drawn by a composite rather than by itself.
+        """
+        self._composited = composited
 
-    def start(self):
-        self._textStim.setAutoDraw(True)
-        super(TextFeature,self).start()
+    def startFeature(self):
+        if not self._composited:
+            self.experiment.stimPool.show(self._textStim)
 
-    def end(self):
-        self._textStim.setAutoDraw(False)
-        super(TextFeature,self).end()
+    def endFeature(self):
+        if not self._composited:
+            self.experiment.stimPool.hide(self._textStim)
 
 class ImageFeature(AbstractFeature):
     """
@@ -281,17 +421,133 @@ class ImageFeature(AbstractFeature):
             Experiment to which this belongs.  Not necessary if this is not the base.
         """
         super(ImageFeature,self).__init__(origin, experiment = experiment)
-        self._imageStim = visual.ImageStim(self.experiment.participantWindow, image=image, 
-                    mask=mask, units=units, pos=pos, size=size, ori=ori, color=color, 
-                    colorSpace=colorSpace, contrast=contrast, opacity=opacity, depth=depth, 
-                    interpolate=interpolate, flipHoriz=flipHoriz, flipVert=flipVert, 
-                    texRes=texRes, name=name, autoLog=autoLog, maskParams=maskParams)
+        # the ImageStim is not built until it is needed so that textures are only
+        # resident while the routine is within the preload window
+        self._stimParams = dict(image=image, mask=mask, units=units, pos=pos, size=size, 
+                    ori=ori, color=color, colorSpace=colorSpace, contrast=contrast, 
+                    opacity=opacity, depth=depth, interpolate=interpolate, 
+                    flipHoriz=flipHoriz, flipVert=flipVert, texRes=texRes, name=name, 
+                    autoLog=autoLog, maskParams=maskParams)
+        self._imageStim = None
+        self._composited = False
+
+    def _buildStim(self):
+        """
+        Create the ImageStim if it doesn't already exist.
+        """
+        if self._imageStim is None:
+            params = dict(self._stimParams)
+            # share decoded pixels between features showing the same file, and use the
+            # pre-rendered copy for this window size where one exists
+            if isinstance(params['image'], basestring):
+                windowSize = tuple(self.experiment.participantWindow.size)
+                params['image'] = textureCache.getImage(params['image'], windowSize, 
+                                    lambda path: prerender.loadImage(path, windowSize))
+            self._imageStim = self.experiment.createStim('ImageStim', **params)
 
+    def prepare(self):
+        self._buildStim()
+        super(ImageFeature,self).prepare()
 
-    def start(self):
-        self._imageStim.setAutoDraw(True)
-        super(ImageFeature,self).start()
+    def release(self):
+        self._imageStim = None
+        super(ImageFeature,self).release()
 
-    def end(self):
-        self._imageStim.setAutoDraw(False)
-        super(ImageFeature,self).end()
+    def layerStim(self):
+        """
+        Returns
+        -------
+        ImageStim
+            The stimulus, for drawing into a composite (see CompositeFeature).
+        """
+        self._buildStim()
+        return self._imageStim
+
+    def setComposited(self, composited):
+        """
+        Set whether the stimulus is drawn by a composite rather than by itself.
+        """
+        self._composited = composited
+
+    def startFeature(self):
+        self._buildStim()
+        if not self._composited:
+            self._imageStim.setAutoDraw(True)
+
+    def endFeature(self):
+        if not self._composited:
+            self._imageStim.setAutoDraw(False)
+
+class CompositeFeature(AbstractFeature):
+    """
+    Draws the text and image features it decorates as a single pre-rendered layer.
+
+    When the experiment's 'compositing' parameter is 'true', prepare() draws the stimuli
+    of the decorated features into one BufferImageStim, which is then drawn with a single
+    call per frame instead of one call per stimulus.  Only decorate features whose
+    stimuli don't change while the routine runs.  Otherwise this feature does nothing.
+    """
+
+    def __init__(self, origin, experiment = None, name = None):
+        """
+        Initialize an instance of CompositeFeature.
+
+        Parameters
+        ----------
+        origin : AbstractFeature
+            Feature being decorated.  None if this is the base.
+        experiment : Experiment
+            Experiment to which this belongs.  Not necessary if this is not the base.
+        name : str
+            Name of the composite stimulus.
+        """
+        super(CompositeFeature,self).__init__(origin, experiment = experiment)
+        self._name = name
+        self._composite = None
+
+    def _layers(self):
+        """
+        The decorated text and image features, in the order they are drawn
+        """
+        layers = list()
+        feature = self.origin
+        while feature:
+            if isinstance(feature, (TextFeature, ImageFeature)):
+                layers.append(feature)
+            feature = feature.origin
+        return layers
+
+    def _buildComposite(self):
+        """
+        Render the layers into the composite if compositing is enabled and it doesn't
+        already exist.
+        """
+        if self._composite is not None or self.experiment.compositing != 'true':
+            return
+        layers = self._layers()
+        self._composite = self.experiment.createStim('BufferImageStim', 
+                                stim = [layer.layerStim() for layer in layers], name = self._name)
+        # rendering the layers used the back buffer, which the next flip must not show
+        self.experiment.participantWindow.clearBuffer()
+        for layer in layers:
+            layer.setComposited(True)
+
+    def prepare(self):
+        super(CompositeFeature,self).prepare()
+        self._buildComposite()
+
+    def release(self):
+        if self._composite is not None:
+            self._composite = None
+            for layer in self._layers():
+                layer.setComposited(False)
+        super(CompositeFeature,self).release()
+
+    def startFeature(self):
+        self._buildComposite()
+        if self._composite is not None:
+            self._composite.setAutoDraw(True)
+
+    def endFeature(self):
+        if self._composite is not None:
+            self._composite.setAutoDraw(False)
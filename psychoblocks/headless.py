@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module contains stand-ins for the psychopy window, stimuli and clock so that whole
+experiments can be run without a display.  Time is simulated: each flip advances the
+clock by one frame, so runs complete faster than real time.
+"""
+
+class SimulatedClock(object):
+    """
+    Clock which only advances when told to.
+    """
+
+    def __init__(self):
+        self._time = 0.0
+
+    def getTime(self):
+        """
+        Returns
+        -------
+        float
+            The simulated time in seconds.
+        """
+        return self._time
+
+    def reset(self, newT = 0.0):
+        """
+        Reset the clock (matches psychopy's clock.Clock).
+        """
+        self._time = newT
+
+    def advance(self, seconds):
+        """
+        Move the clock forwards.
+
+        Parameters
+        ----------
+        seconds : float
+            Time to advance by.
+        """
+        self._time += seconds
+
+class NullWindow(object):
+    """
+    Window which draws nothing and whose flips advance a SimulatedClock by one frame.
+    """
+
+    def __init__(self, size, frameRate, clock):
+        """
+        Initialize an instance of NullWindow.
+
+        Parameters
+        ----------
+        size : tuple
+            (width, height) of the simulated window in pixels.
+        frameRate : float
+            Simulated refresh rate in hz.
+        clock : SimulatedClock
+            Clock advanced by each flip.
+        """
+        self._size = tuple(size)
+        self._frameRate = frameRate
+        self._clock = clock
+        self._frames = 0
+
+    def flip(self, clearBuffer = True):
+        """
+        Advance the clock by one frame.
+
+        Returns
+        -------
+        float
+            The simulated time of the flip.
+        """
+        self._clock.advance(1.0 / self._frameRate)
+        self._frames += 1
+        return self._clock.getTime()
+
+    def clearBuffer(self):
+        pass
+
+    def getActualFrameRate(self, **kwargs):
+        """
+        Returns
+        -------
+        float
+            The simulated refresh rate.
+        """
+        return self._frameRate
+
+    def close(self):
+        pass
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def frames(self):
+        return self._frames
+
+class NullStim(object):
+    """
+    Stimulus which accepts the psychopy stimulus parameters but draws nothing.
+    """
+
+    def __init__(self, **params):
+        self._params = params
+        self._autoDraw = False
+
+    def setAutoDraw(self, value, log = None):
+        self._autoDraw = value
+
+    def draw(self, win = None):
+        pass
+
+    @property
+    def autoDraw(self):
+        return self._autoDraw
+
+    @property
+    def params(self):
+        return self._params
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module reads the keyboard and response box once per frame and hands the events to
+the features which subscribed to them, so that consumers (e.g EscapeCheck and
+SpacebarLoop) never drain each other's keys.
+"""
+from collections import namedtuple
+
+InputEvent = namedtuple('InputEvent', ['source', 'key', 'timestamp'])
+"""
+namedtuple: an input from 'keyboard' (key is the key name) or 'serial' (key is the byte
+read, as an int) and the clock time it was made
+"""
+
+SOURCES = ('keyboard', 'serial')
+"""
+tuple: the input sources which can be subscribed to
+"""
+
+class InputDispatcher(object):
+    """
+    Pumps the input sources and routes their events to subscribers.
+
+    The keyboard is only read while a feature is subscribed to it, and only for the
+    keys subscribed to, so frames without subscribers cost nothing.  Keyboard events
+    are timestamped on the experiment clock (the same clock as flips and serial events).
+
+    Attributes
+    ----------
+    clock : clock.Clock
+        Clock used to timestamp keyboard events.
+    device : AbstractResponseDevice
+        Source of serial events, or None.
+    """
+
+    def __init__(self, clock, keyboard = True):
+        """
+        Initialize an instance of InputDispatcher.
+
+        Parameters
+        ----------
+        clock : clock.Clock
+            Clock used to timestamp keyboard events.
+        keyboard : bool
+            Whether there is a keyboard to read (i.e not headless).
+        """
+        self._clock = clock
+        self._keyboard = keyboard
+        self._getKeys = None
+        self._device = None
+        self._subscribers = dict((source, list()) for source in SOURCES)
+
+    def setDevice(self, device):
+        """
+        Set the source of serial events.
+
+        Parameters
+        ----------
+        device : AbstractResponseDevice
+            The response device, or None.
+        """
+        self._device = device
+
+    def subscribe(self, source, callback, keys = None):
+        """
+        Route events from a source to a callback.
+
+        Parameters
+        ----------
+        source : str
+            'keyboard' or 'serial'.
+        callback : callable
+            Called with each InputEvent.
+        keys : list
+            The keys (or serial bytes) to route.  None routes every event of the source.
+        """
+        if source not in SOURCES:
+            raise ValueError('Unknown input source ('+source+')')
+        self._subscribers[source].append((callback, None if keys is None else tuple(keys)))
+
+    def unsubscribe(self, source, callback):
+        """
+        Stop routing events from a source to a callback.
+
+        Parameters
+        ----------
+        source : str
+            'keyboard' or 'serial'.
+        callback : callable
+            The callback passed to subscribe.
+        """
+        self._subscribers[source] = [(subscriber, keys)
+                                     for subscriber, keys in self._subscribers[source]
+                                     if subscriber != callback]
+
+    def _keyList(self):
+        """
+        The keys subscribed to, or None if any subscriber wants every key
+        """
+        keyList = set()
+        for callback, keys in self._subscribers['keyboard']:
+            if keys is None:
+                return None
+            keyList.update(keys)
+        return list(keyList)
+
+    def pump(self):
+        """
+        Read the subscribed sources once and route their events.
+
+        Returns
+        -------
+        list
+            The events read.
+        """
+        events = list()
+        if self._keyboard and self._subscribers['keyboard']:
+            if self._getKeys is None:
+                # psychopy.event is imported here rather than at startup since it is slow to import
+                from psychopy import event
+                self._getKeys = event.getKeys
+            for key, timestamp in self._getKeys(keyList = self._keyList(), timeStamped = self._clock):
+                events.append(InputEvent('keyboard', key, timestamp))
+        if self._device is not None and self._subscribers['serial']:
+            for event in self._device.poll():
+                events.append(InputEvent('serial', event.code, event.timestamp))
+
+        for event in events:
+            # copied so that callbacks can unsubscribe
+            for callback, keys in list(self._subscribers[event.source]):
+                if keys is None or event.key in keys:
+                    callback(event)
+        return events
+
+    @property
+    def clock(self):
+        return self._clock
+
+    @property
+    def device(self):
+        return self._device
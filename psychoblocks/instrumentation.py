@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module records frame level timing so that a session can be checked for timing
+faults before its data is analysed.
+"""
+import csv
+import numpy
+
+import const
+
+FLIP, RUN, INTERVAL = range(3)
+
+HISTOGRAM_EDGES = (0.0, 0.5, 0.9, 1.1, 1.5, 2.5, numpy.inf)
+"""
+tuple: flip interval histogram bin edges, in multiples of the frame duration
+"""
+
+PERCENTILES = (50, 95, 99)
+"""
+tuple: percentiles reported for flip intervals and run durations
+"""
+
+class FrameTimer(object):
+    """
+    Records every flip into a preallocated ring buffer and summarises each routine.
+
+    For each frame the buffer holds the flip time, the time spent running the feature
+    chain before the flip and the interval since the previous flip.  A frame misses its
+    deadline when its interval exceeds 1.5 frame durations.  The interval before the
+    first frame of a routine spans the routine boundary (e.g a wait for the scanner), so
+    it is reported as the routine's start latency rather than as a missed frame.
+
+    Attributes
+    ----------
+    frameDuration : float
+        Expected seconds between flips.
+    summaries : list
+        One dict per finished routine.
+    """
+
+    def __init__(self, clock, frameRate, capacity = const.FRAME_BUFFER_SIZE):
+        """
+        Initialize an instance of FrameTimer.
+
+        Parameters
+        ----------
+        clock : clock.Clock
+            Clock used to time frames.
+        frameRate : float
+            Refresh rate of the participant window in hz.
+        capacity : int
+            Number of frames held by the ring buffer.
+        """
+        self._clock = clock
+        self._frameDuration = 1.0 / frameRate
+        self._buffer = numpy.zeros((capacity, 3))
+        self._count = 0
+        self._runStart = None
+        self._runDuration = numpy.nan
+        self._lastFlip = None
+        self._routine = None
+        self._routineStart = 0
+        self._startLatency = numpy.nan
+        self._summaries = list()
+
+    def startRun(self):
+        """
+        Mark the start of a pass through the feature chain.
+        """
+        self._runStart = self._clock.getTime()
+
+    def endRun(self):
+        """
+        Mark the end of a pass through the feature chain.
+        """
+        self._runDuration = self._clock.getTime() - self._runStart
+
+    def recordFlip(self, flipTime):
+        """
+        Record a flip.
+
+        Parameters
+        ----------
+        flipTime : float
+            Time of the flip on the clock.
+        """
+        row = self._buffer[self._count % len(self._buffer)]
+        row[FLIP] = flipTime
+        row[RUN] = self._runDuration
+        row[INTERVAL] = numpy.nan if self._lastFlip is None else flipTime - self._lastFlip
+        if self._count == self._routineStart:
+            # the first interval of a routine spans the routine boundary
+            self._startLatency = row[INTERVAL]
+            row[INTERVAL] = numpy.nan
+        self._lastFlip = flipTime
+        self._runDuration = numpy.nan
+        self._count += 1
+
+    def startRoutine(self, name):
+        """
+        Mark the start of a routine.
+
+        Parameters
+        ----------
+        name : str
+            Name used for the routine in the summary.
+        """
+        self._routine = name
+        self._routineStart = self._count
+        self._startLatency = numpy.nan
+
+    def endRoutine(self):
+        """
+        Summarise the frames recorded since the routine started.
+
+        Returns
+        -------
+        dict
+            The summary, or None if the routine didn't flip.
+        """
+        frames = self._count - self._routineStart
+        if frames == 0:
+            return None
+        # if the routine wrapped the buffer only the most recent frames are available
+        kept = min(frames, len(self._buffer))
+        indices = numpy.arange(self._count - kept, self._count) % len(self._buffer)
+        rows = self._buffer[indices]
+        intervals = rows[:, INTERVAL][~numpy.isnan(rows[:, INTERVAL])]
+        runs = rows[:, RUN][~numpy.isnan(rows[:, RUN])]
+
+        summary = {'routine'       : self._routine,
+                   'index'         : len(self._summaries),
+                   'onset'         : rows[0, FLIP],
+                   'frames'        : frames,
+                   'start latency' : self._startLatency,
+                   'missed'        : int(numpy.sum(intervals > 1.5 * self.frameDuration))}
+        for p in PERCENTILES:
+            summary['interval p'+str(p)] = _percentile(intervals, p)
+            summary['run p'+str(p)] = _percentile(runs, p)
+        summary['interval max'] = intervals.max() if len(intervals) else numpy.nan
+        summary['run max'] = runs.max() if len(runs) else numpy.nan
+        counts, edges = numpy.histogram(intervals / self.frameDuration, HISTOGRAM_EDGES)
+        for count, edge in zip(counts, edges):
+            summary['hist '+str(edge)] = int(count)
+
+        self._summaries.append(summary)
+        return summary
+
+    def fieldnames(self):
+        """
+        Returns
+        -------
+        list
+            Column names of the summaries, in order.
+        """
+        names = ['routine', 'index', 'onset', 'frames', 'start latency', 'missed']
+        names += ['interval p'+str(p) for p in PERCENTILES] + ['interval max']
+        names += ['run p'+str(p) for p in PERCENTILES] + ['run max']
+        names += ['hist '+str(edge) for edge in HISTOGRAM_EDGES[:-1]]
+        return names
+
+    def save(self, filename):
+        """
+        Write the routine summaries as a csv.
+
+        Parameters
+        ----------
+        filename : str
+            Path of the csv to write.
+        """
+        with open(filename, 'w') as fh:
+            writer = csv.DictWriter(fh, fieldnames = self.fieldnames())
+            writer.writeheader()
+            for summary in self.summaries:
+                writer.writerow(summary)
+
+    @property
+    def frameDuration(self):
+        return self._frameDuration
+
+    @property
+    def summaries(self):
+        return self._summaries
+
+def _percentile(values, p):
+    """
+    numpy.percentile, returning nan for an empty array.
+    """
+    if not len(values):
+        return numpy.nan
+    return numpy.percentile(values, p)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module parses the command line of the task scripts so that experiments can be 
+launched without the parameter dialog.
+
+Every parameter in the dialog has a matching option (spaces replaced by dashes, e.g
+--run-file).  Parameters can also be read from a json config file.  If any parameters
+are given, the dialog is skipped.  Several runs (and participants) can be queued with
+--runs and --participants to carry them out in one process.
+"""
+import argparse
+import json
+
+from experiment import defaultInfo
+
+def parseArgs(name, argv = None):
+    """
+    Parse the command line of a task script.
+
+    Parameters
+    ----------
+    name : str
+        Name of the experiment task
+    argv : list
+        Arguments to parse.  Defaults to sys.argv[1:].
+
+    Returns
+    -------
+    dict
+        Keyword arguments for Experiment (headless, info and interactive).
+    list
+        The (runFile, participant) pairs to queue in a Session.  Empty if no runs or
+        participants were given.
+    """
+    parser = argparse.ArgumentParser(description = 'Run the '+name+' task.')
+    parser.add_argument('--config', help = 'json file of experiment parameters')
+    parser.add_argument('--headless', action = 'store_true', default = None,
+                        help = 'run without a display using a simulated clock')
+    parser.add_argument('--no-dialog', action = 'store_true', 
+                        help = "don't show the parameter dialog")
+    parser.add_argument('--runs', nargs = '+', default = [],
+                        help = 'run files to carry out one after the other')
+    parser.add_argument('--participants', nargs = '+', default = [],
+                        help = 'participants to carry out the runs for')
+    keys = sorted(defaultInfo(name).keys())
+    for key in keys:
+        parser.add_argument('--'+key.replace(' ','-'), dest = key, 
+                            help = 'experiment parameter: '+key)
+    args = vars(parser.parse_args(argv))
+
+    info = dict()
+    if args['config']:
+        with open(args['config']) as fh:
+            info.update(json.load(fh))
+    for key in keys:
+        if args[key] is not None:
+            info[key] = args[key]
+
+    runs = list()
+    if args['runs'] or args['participants']:
+        runFiles = args['runs'] or [None]
+        for participant in args['participants'] or [None]:
+            for runFile in runFiles:
+                runs.append((runFile, participant))
+    batched = bool(runs)
+
+    return ({'headless'    : args['headless'],
+             'info'        : info,
+             'interactive' : not (info or batched or args['no_dialog'])},
+            runs)
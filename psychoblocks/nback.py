@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module generates n-back blocks in bulk.
+
+Sequences are arrays of stimulus labels (1 being the first stimulus shown).  A target is
+a trial showing the same stimulus as n trials before; a lure is a trial repeating an
+earlier stimulus at any other distance.  Candidates are built and checked thousands at
+a time, so whole studies worth of blocks can be generated in one call.
+"""
+import os
+import csv
+import numpy
+
+def _rows(count):
+    """
+    Row indices for fancy indexing a (count, ...) array
+    """
+    return numpy.arange(count)[:, None]
+
+def classify(sequences, n):
+    """
+    Classify the trials of a batch of sequences.
+
+    Parameters
+    ----------
+    sequences : numpy.ndarray
+        (count, length) array of stimulus labels.
+    n : int
+        The n of the n-back task.
+
+    Returns
+    -------
+    numpy.ndarray
+        (count, length) boolean array of the targets.
+    numpy.ndarray
+        (count, length) boolean array of the lures.
+    numpy.ndarray
+        (count, length) array of the number of times each trial's stimulus is shown.
+    """
+    sequences = numpy.asarray(sequences)
+    length = sequences.shape[1]
+    same = sequences[:, :, None] == sequences[:, None, :]
+    earlier = numpy.tril(numpy.ones((length, length), dtype = bool), -1)
+    repeat = (same & earlier).any(axis = 2)
+    target = numpy.zeros(sequences.shape, dtype = bool)
+    if 0 < n < length:
+        target[:, n:] = sequences[:, n:] == sequences[:, :-n]
+    return target, repeat & ~target, same.sum(axis = 2)
+
+def check(sequences, n, targets, lures):
+    """
+    Check a batch of sequences against the block constraints: exactly the given number
+    of targets and lures, and no stimulus shown more than twice.
+
+    Parameters
+    ----------
+    sequences : numpy.ndarray
+        (count, length) array of stimulus labels.
+    n : int
+        The n of the n-back task.
+    targets : int
+        Number of targets per block.
+    lures : int
+        Number of lures per block.
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean array of the sequences meeting the constraints.
+    """
+    target, lure, shown = classify(sequences, n)
+    return ((target.sum(axis = 1) == targets) & (lure.sum(axis = 1) == lures) &
+            (shown.max(axis = 1) <= 2))
+
+def candidates(count, n, length, targets, lures, random):
+    """
+    Build a batch of candidate sequences.
+
+    Target and lure positions are drawn at random, so some candidates (e.g. those whose
+    pairs overlap) break the constraints and have to be filtered with check().
+
+    Parameters
+    ----------
+    count : int
+        Number of candidates.
+    n : int
+        The n of the n-back task.
+    length : int
+        Number of trials per block.
+    targets : int
+        Number of targets per block.
+    lures : int
+        Number of lures per block.
+    random : numpy.random.RandomState
+        Source of randomness.
+
+    Returns
+    -------
+    numpy.ndarray
+        (count, length) array of stimulus labels.
+    """
+    rows = _rows(count)
+    # each trial starts out as the first showing of its own stimulus
+    source = numpy.tile(numpy.arange(length), (count, 1))
+    used = numpy.zeros((count, length), dtype = bool)
+
+    # targets repeat the stimulus shown n trials earlier
+    target = numpy.argsort(random.rand(count, length - n), axis = 1)[:, :targets] + n
+    source[rows, target] = target - n
+    used[rows, target] = True
+    used[rows, target - n] = True
+
+    # lures pair up two of the remaining trials
+    keys = random.rand(count, length)
+    keys[used] = numpy.inf
+    picked = numpy.argsort(keys, axis = 1)[:, :2 * lures]
+    first = numpy.minimum(picked[:, :lures], picked[:, lures:])
+    second = numpy.maximum(picked[:, :lures], picked[:, lures:])
+    source[rows, second] = first
+
+    # label the stimuli in the order they are first shown
+    fresh = source == numpy.arange(length)
+    labels = numpy.cumsum(fresh, axis = 1)
+    return labels[rows, source]
+
+def _unique(sequences):
+    """
+    The distinct rows of a (count, length) array, in the order they are first found.
+    Rows are compared as raw bytes, since numpy.unique only takes an axis from numpy 1.13
+    """
+    sequences = numpy.ascontiguousarray(sequences)
+    rowType = numpy.dtype((numpy.void, sequences.dtype.itemsize * sequences.shape[1]))
+    _, index = numpy.unique(sequences.view(rowType).ravel(), return_index = True)
+    return sequences[numpy.sort(index)]
+
+def _pool(size, n, length, targets, lures, random, unique = True, batch = 4096,
+          attempts = 1000, patience = 5):
+    """
+    Collect up to size sequences meeting the block constraints.  When unique, stops early
+    once patience batches in a row find no new sequences (i.e all possible sequences have
+    most likely been found).  Gives up after attempts batches.
+    """
+    if n < 1 and (targets or lures):
+        raise ValueError('Targets and lures need n of at least 1')
+    if length < n + targets or length < 2 * (targets + lures):
+        raise ValueError('Blocks of %d trials are too short for %d targets and %d lures'
+                         % (length, targets, lures))
+    found = numpy.zeros((0, length), dtype = int)
+    stale = 0
+    for attempt in range(attempts):
+        batchSequences = candidates(batch, n, length, targets, lures, random)
+        previous = len(found)
+        found = numpy.concatenate([found, batchSequences[check(batchSequences, n, targets, lures)]])
+        if unique:
+            found = _unique(found)
+            # a batch may find nothing by chance, so only stop once the pool stops growing
+            stale = stale + 1 if len(found) == previous else 0
+            if len(found) and stale >= patience:
+                break
+        if len(found) >= size:
+            break
+    return found[:size]
+
+def generate(count, n, length = 10, targets = 2, lures = 2, seed = None, unique = True):
+    """
+    Generate sequences meeting the block constraints.
+
+    Parameters
+    ----------
+    count : int
+        Number of sequences.
+    n : int
+        The n of the n-back task.
+    length : int
+        Number of trials per block.
+    targets : int
+        Number of targets per block.
+    lures : int
+        Number of lures per block.
+    seed : int
+        Seed for the generator.  Defaults to a random seed.
+    unique : bool
+        Whether every sequence should be different.
+
+    Returns
+    -------
+    numpy.ndarray
+        (count, length) array of stimulus labels.
+    """
+    found = _pool(count, n, length, targets, lures, numpy.random.RandomState(seed), unique)
+    if len(found) < count:
+        raise ValueError('Only %d different sequences meet the constraints' % len(found))
+    return found
+
+def generateSets(participants, blocks, n, length = 10, targets = 2, lures = 2, seed = None):
+    """
+    Generate a set of different blocks for each of several participants.
+
+    Every block has the same number of targets and lures.  The participants draw their
+    blocks from one pool of different sequences (as large as the constraints allow), so 
+    no participant is given the same sequence twice and the sequences are spread evenly 
+    over the participants.
+
+    Parameters
+    ----------
+    participants : int
+        Number of participants.
+    blocks : int
+        Number of blocks per participant.
+    n : int
+        The n of the n-back task.
+    length : int
+        Number of trials per block.
+    targets : int
+        Number of targets per block.
+    lures : int
+        Number of lures per block.
+    seed : int
+        Seed for the generator.  Defaults to a random seed.
+
+    Returns
+    -------
+    numpy.ndarray
+        (participants, blocks, length) array of stimulus labels.
+    """
+    random = numpy.random.RandomState(seed)
+    pool = _pool(participants * blocks, n, length, targets, lures, random)
+    if len(pool) < blocks:
+        raise ValueError('Only %d different sequences meet the constraints' % len(pool))
+    # deal the (shuffled) pool out in turn, wrapping around when it runs out
+    order = random.permutation(len(pool))
+    slots = numpy.arange(participants)[:, None] * blocks + numpy.arange(blocks)
+    draw = order[slots % len(pool)]
+    return pool[draw]
+
+def assignStimuli(sets, stimuli, seed = None):
+    """
+    Replace the stimulus labels with stimuli.  Each participant gets different stimuli
+    in each of their blocks.
+
+    Parameters
+    ----------
+    sets : numpy.ndarray
+        (participants, blocks, length) array of stimulus labels.
+    stimuli : list
+        The stimuli (e.g image file names) to draw from.
+    seed : int
+        Seed for the generator.  Defaults to a random seed.
+
+    Returns
+    -------
+    numpy.ndarray
+        (participants, blocks, length) array of stimuli.
+    """
+    participants, blocks, length = sets.shape
+    perBlock = sets.max()
+    if len(stimuli) < blocks * perBlock:
+        raise ValueError('%d blocks of %d stimuli need more than %d stimuli'
+                         % (blocks, perBlock, len(stimuli)))
+    random = numpy.random.RandomState(seed)
+    chosen = numpy.argsort(random.rand(participants, len(stimuli)), axis = 1)
+    offset = (numpy.arange(blocks) * perBlock)[None, :, None]
+    index = chosen[numpy.arange(participants)[:, None, None], offset + sets - 1]
+    return numpy.asarray(stimuli, dtype = object)[index]
+
+def writeBlock(filename, stimuli, labels, n):
+    """
+    Write a block file in the format read by the n-back tasks.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the block file.
+    stimuli : sequence
+        The stimulus of each trial.
+    labels : numpy.ndarray
+        The stimulus label of each trial (used to find the targets and lures).
+    n : int
+        The n of the n-back task.
+    """
+    target, lure, _ = classify(numpy.asarray(labels)[None, :], n)
+    with open(filename, 'w') as fh:
+        writer = csv.writer(fh, lineterminator = '\n')
+        writer.writerow(['Stimulus', 'TargetType', 'BlockType', 'CorrectResponse'])
+        for stimulus, isTarget, isLure in zip(stimuli, target[0], lure[0]):
+            targetType = 'target' if isTarget else ('lure' if isLure else 'nonlure')
+            writer.writerow([stimulus, targetType, '%d-Back' % n, 1 if isTarget else 2])
+
+def writeSets(folder, sets, n, stimuli = None, seed = None):
+    """
+    Write the blocks of several participants, as <folder>/<participant>/b<block>.csv.
+
+    Parameters
+    ----------
+    folder : str
+        Folder to write the block files to.
+    sets : numpy.ndarray
+        (participants, blocks, length) array of stimulus labels.
+    n : int
+        The n of the n-back task.
+    stimuli : list
+        Stimuli to assign to the labels.  If None, the labels are written.
+    seed : int
+        Seed for assigning the stimuli.
+
+    Returns
+    -------
+    list
+        The paths of the block files of each participant.
+    """
+    shown = sets if stimuli is None else assignStimuli(sets, stimuli, seed)
+    written = list()
+    for participant in range(sets.shape[0]):
+        participantFolder = os.path.join(folder, '%d' % (participant + 1))
+        if not os.path.exists(participantFolder):
+            os.makedirs(participantFolder)
+        files = list()
+        for block in range(sets.shape[1]):
+            filename = os.path.join(participantFolder, 'b%d.csv' % (block + 1))
+            writeBlock(filename, shown[participant, block], sets[participant, block], n)
+            files.append(filename)
+        written.append(files)
+    return written
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module generates the face-name pairs of the facename task for a whole study.
+
+Each run alternates novel blocks (faces shown with a new name, each face shown once) and
+known blocks (the same few faces every time, shown with their name and a foil from
+another face of the same gender).  Half of every block is female and half male.
+
+Faces and names are dealt out of one shuffled list per gender.  Each participant starts
+at a different point of the lists, so faces are spread evenly over participants, and
+takes a different slice of them for each run, so nothing is reused across a
+participant's runs.  Which slice of a run is known, and whether a run starts with a
+novel or known block, alternate over participants and runs.
+"""
+import os
+import re
+import csv
+import random
+
+def loadFaces(stimuliFolder):
+    """
+    Load the face stimuli, split by gender.
+
+    Parameters
+    ----------
+    stimuliFolder : str
+        Folder holding the stimuli.
+
+    Returns
+    -------
+    list
+        The female faces.
+    list
+        The male faces.
+    """
+    female = list()
+    male = list()
+    for stim in sorted(os.listdir(stimuliFolder)):
+        if re.match(r'^CFD-WM', stim):
+            male.append(stim)
+        elif re.match(r'^CFD-WF', stim):
+            female.append(stim)
+    return female, male
+
+def loadNames(filename):
+    """
+    Load a list of names (one per line).
+
+    Parameters
+    ----------
+    filename : str
+        Path of the names file.
+
+    Returns
+    -------
+    list
+        The names.
+    """
+    with open(filename, 'r') as fh:
+        return [name.strip() for name in fh if name.strip()]
+
+def _deal(items, start, count):
+    """
+    Take count items of a list starting at start, wrapping around the end
+    """
+    return [items[(start + i) % len(items)] for i in range(count)]
+
+def assignRuns(female, male, femaleNames, maleNames, participants, runs, seed = None,
+               blocks = 6, trials = 6):
+    """
+    Assign the face-name pairs of every run of every participant.
+
+    Parameters
+    ----------
+    female, male : list
+        The faces of each gender.
+    femaleNames, maleNames : list
+        The names of each gender.
+    participants : int
+        Number of participants.
+    runs : int
+        Number of runs per participant.
+    seed : int
+        Seed for the assignment.  Defaults to a random seed.
+    blocks : int
+        Number of blocks per run (half of them known).
+    trials : int
+        Number of trials per block (half of them female).
+
+    Returns
+    -------
+    list
+        For each participant, for each run, the list of blocks.  Each block is a tuple
+        (isKnown, rows), where rows are [image, name] for novel blocks and
+        [image, name1, name2, corr] for known blocks.
+    """
+    if blocks % 2 or trials % 2 or trials < 4:
+        raise ValueError('The number of blocks and trials must be even (and at least 4 trials)')
+    half = trials // 2
+    segments = blocks // 2 + 1
+    # faces (and names) of each gender used in a run
+    perRun = half * segments
+    for pool in (female, male, femaleNames, maleNames):
+        if len(pool) < perRun * runs:
+            raise ValueError('%d runs need %d faces and names of each gender'
+                             % (runs, perRun * runs))
+
+    shuffler = random.Random(seed)
+    pools = list()
+    for pool in (female, male, femaleNames, maleNames):
+        pool = list(pool)
+        shuffler.shuffle(pool)
+        pools.append(pool)
+
+    materials = list()
+    for participant in range(participants):
+        rng = random.Random(None if seed is None else '%s-%d' % (seed, participant))
+        # faces and names start at different points, so the pairings differ too
+        faceStart = participant * perRun * runs
+        nameStart = participant * (perRun * runs + half)
+        participantRuns = list()
+        for run in range(runs):
+            genders = list()
+            for faces, names in ((pools[0], pools[2]), (pools[1], pools[3])):
+                pairs = zip(_deal(faces, faceStart + run * perRun, perRun),
+                            _deal(names, nameStart + run * perRun, perRun))
+                genders.append([list(pair) for pair in pairs])
+
+            # one segment of the run's pairs is known, the rest are novel
+            knownSegment = (participant + run) % segments
+            known = [gender[knownSegment * half:(knownSegment + 1) * half]
+                     for gender in genders]
+            novel = [gender[:knownSegment * half] + gender[(knownSegment + 1) * half:]
+                     for gender in genders]
+
+            runBlocks = list()
+            knownFirst = (participant + run) % 2 == 1
+            for block in range(blocks):
+                if (block % 2 == 1) == knownFirst:
+                    index = block // 2
+                    rows = (novel[0][index * half:(index + 1) * half] +
+                            novel[1][index * half:(index + 1) * half])
+                    rows = [list(row) for row in rows]
+                    rng.shuffle(rows)
+                    runBlocks.append((False, rows))
+                else:
+                    # the correct name is in each column equally often
+                    corrs = [0, 1] * half
+                    rng.shuffle(corrs)
+                    rows = list()
+                    for gender in known:
+                        for j, (image, name) in enumerate(gender):
+                            # the foil is the name of another face of the same gender
+                            foil = gender[(j + rng.randrange(1, half)) % half][1]
+                            rows.append([image, name, foil])
+                    rng.shuffle(rows)
+                    for row, corr in zip(rows, corrs):
+                        names = row[1:] if corr == 0 else row[:0:-1]
+                        row[1:] = names + [corr]
+                    runBlocks.append((True, rows))
+            participantRuns.append(runBlocks)
+        materials.append(participantRuns)
+    return materials
+
+def writeMaterials(taskFolder, materials, participantIds = None):
+    """
+    Write the block and run files of a study, as <taskFolder>/blocks/<id>_r<run>b<block>.csv
+    and <taskFolder>/runs/<id>_run<run>.csv.
+
+    Parameters
+    ----------
+    taskFolder : str
+        The task folder (e.g facename).
+    materials : list
+        The blocks of every run of every participant (see assignRuns).
+    participantIds : list
+        Ids to name the files of each participant by.  Defaults to 1, 2, ...
+
+    Returns
+    -------
+    list
+        The run files of each participant.
+    """
+    if participantIds is None:
+        participantIds = [str(participant + 1) for participant in range(len(materials))]
+    for folder in ('blocks', 'runs'):
+        if not os.path.exists(os.path.join(taskFolder, folder)):
+            os.makedirs(os.path.join(taskFolder, folder))
+
+    written = list()
+    for participantId, participantRuns in zip(participantIds, materials):
+        runFiles = list()
+        for run, runBlocks in enumerate(participantRuns):
+            runFile = os.path.join(taskFolder, 'runs', '%s_run%d.csv' % (participantId, run + 1))
+            with open(runFile, 'w') as runFh:
+                runWriter = csv.writer(runFh, lineterminator = '\n')
+                runWriter.writerow(['blockFile', 'isKnown', 'isNovel'])
+                for block, (isKnown, rows) in enumerate(runBlocks):
+                    blockFile = os.path.join(taskFolder, 'blocks', '%s_r%db%d.csv'
+                                             % (participantId, run + 1, block))
+                    with open(blockFile, 'w') as fh:
+                        writer = csv.writer(fh, lineterminator = '\n')
+                        if isKnown:
+                            writer.writerow(['image', 'name1', 'name2', 'corr'])
+                        else:
+                            writer.writerow(['image', 'name'])
+                        writer.writerows(rows)
+                    runWriter.writerow([blockFile, int(isKnown), int(not isKnown)])
+            runFiles.append(runFile)
+        written.append(runFiles)
+    return written
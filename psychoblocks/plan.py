@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module compiles a declarative task spec and a run file into a routine plan.
+
+A task spec is a json file describing how the rows of a run file become routines:
+
+    {
+        "condition" : "isKnown",
+        "rest"      : {"routine" : "RestBlock"},
+        "between"   : {"routine" : "Fixation", "args" : {"duration" : 0.5}},
+        "stimuli"   : ["image"],
+        "blocks"    : {
+            "1" : {"cue"   : {"routine" : "KnownCue"},
+                   "trial" : {"routine" : "KnownTrial",
+                              "args"    : {"image" : "$image", "name1" : "$name1",
+                                           "name2" : "$name2", "correctResponse" : null}}},
+            "0" : {...}
+        }
+    }
+
+Each row of the run file names a block file and the value of the condition column picks
+the block spec.  A block starts with its cue and its trials are separated by the
+"between" routine; blocks are separated by the "rest" routine.  Arguments starting with
+$ are read from a column of the trial (or, for the cue, of the first trial matching the
+block's "cueRow" filter), and columns listed in "stimuli" are joined to the stimuli folder.
+
+The plan is a list of (routine, arguments) pairs which is cached as json, keyed by the
+hashes of the spec and run file.  The block files it was compiled from are stored with
+their hashes, so a cached plan is only used while none of its files have changed.
+"""
+import os
+import csv
+import json
+import hashlib
+
+import const
+import routines
+
+def fileHash(path):
+    """
+    SHA-1 of the contents of a file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file.
+
+    Returns
+    -------
+    str
+        Hex digest of the file contents.
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        sha.update(fh.read())
+    return sha.hexdigest()
+
+def readRows(path):
+    """
+    Read the rows of a csv file.
+
+    Parameters
+    ----------
+    path : str
+        Path to the csv file.
+
+    Returns
+    -------
+    list
+        A dict per row, keyed by the column names.
+    """
+    if not os.path.exists(path):
+        raise ValueError("Couldn't find conditions file ("+path+")")
+    with open(path, 'rb') as fh:
+        return list(csv.DictReader(fh))
+
+def _resolve(step, row, stimuliFolder, stimuli, source):
+    """
+    Resolve a routine spec against a row of a block file
+    """
+    routine = str(step['routine'])
+    if not hasattr(routines, routine):
+        raise ValueError('Unknown routine ('+routine+') in task spec')
+    args = dict()
+    for key, value in step.get('args', dict()).items():
+        if isinstance(value, basestring) and value.startswith('$'):
+            column = value[1:]
+            if row is None or column not in row:
+                raise ValueError('Missing column ('+column+') in '+source)
+            value = row[column]
+            if column in stimuli:
+                value = os.path.join(stimuliFolder, value)
+        args[str(key)] = value
+    return (routine, args)
+
+def compilePlan(spec, runFile, stimuliFolder = const.DEFAULT_STIMULI_FOLDER):
+    """
+    Compile a task spec and run file into a routine plan.
+
+    Parameters
+    ----------
+    spec : dict
+        The task spec.
+    runFile : str
+        Path of the run file.
+    stimuliFolder : str
+        Folder the stimuli columns are relative to.
+
+    Returns
+    -------
+    list
+        The (routine, arguments) pairs of the run, in order.
+    dict
+        Hashes of the block files, keyed by path.
+    """
+    condition = spec['condition']
+    stimuli = spec.get('stimuli', list())
+    steps = list()
+    depends = dict()
+
+    for blockIndex, line in enumerate(readRows(runFile)):
+        if blockIndex and 'rest' in spec:
+            # after each block there should be a rest block
+            steps.append(_resolve(spec['rest'], None, stimuliFolder, stimuli, runFile))
+
+        blockFile = line['blockFile']
+        blockRows = readRows(blockFile)
+        depends[blockFile] = fileHash(blockFile)
+        if line.get(condition) not in spec['blocks']:
+            raise ValueError('No block spec for '+condition+' = '+str(line.get(condition))+
+                             ' in '+runFile)
+        block = spec['blocks'][line[condition]]
+
+        # the cue may be given the values of a particular trial (e.g the 0-back target)
+        cueRow = None
+        if 'cueRow' in block:
+            for row in blockRows:
+                if all(row.get(key) == value for key, value in block['cueRow'].items()):
+                    cueRow = row
+                    break
+            else:
+                raise ValueError('No trial matching the cue in '+blockFile)
+        steps.append(_resolve(block['cue'], cueRow, stimuliFolder, stimuli, blockFile))
+
+        for trialIndex, row in enumerate(blockRows):
+            # after each trial there should be a brief fixation
+            if trialIndex and 'between' in spec:
+                steps.append(_resolve(spec['between'], None, stimuliFolder, stimuli, blockFile))
+            steps.append(_resolve(block['trial'], row, stimuliFolder, stimuli, blockFile))
+
+    return steps, depends
+
+def loadPlan(specFile, runFile, stimuliFolder = const.DEFAULT_STIMULI_FOLDER,
+             cacheFolder = const.PLAN_CACHE_FOLDER):
+    """
+    Load the routine plan of a run, compiling (and caching) it if there is no up to date
+    plan in the cache.
+
+    Parameters
+    ----------
+    specFile : str
+        Path of the task spec.
+    runFile : str
+        Path of the run file.
+    stimuliFolder : str
+        Folder the stimuli columns are relative to.
+    cacheFolder : str
+        Folder holding the cached plans.
+
+    Returns
+    -------
+    list
+        The (routine, arguments) pairs of the run, in order.
+    """
+    if not os.path.exists(runFile):
+        raise ValueError("Couldn't find runfile ("+runFile+")")
+    key = hashlib.sha1()
+    key.update(fileHash(specFile))
+    key.update(fileHash(runFile))
+    key.update(os.path.abspath(runFile).encode('utf-8'))
+    key.update(stimuliFolder.encode('utf-8'))
+    cacheFile = os.path.join(cacheFolder, key.hexdigest()+'.json')
+
+    if os.path.exists(cacheFile):
+        with open(cacheFile) as fh:
+            cached = json.load(fh)
+        if all(os.path.exists(path) and fileHash(path) == digest
+               for path, digest in cached['depends'].items()):
+            return [(str(routine), dict((str(k), v) for k, v in args.items()))
+                    for routine, args in cached['plan']]
+
+    with open(specFile) as fh:
+        spec = json.load(fh)
+    steps, depends = compilePlan(spec, runFile, stimuliFolder)
+
+    if not os.path.exists(cacheFolder):
+        os.makedirs(cacheFolder)
+    tmpFile = cacheFile+'.tmp'
+    with open(tmpFile, 'w') as fh:
+        json.dump({'depends' : depends, 'plan' : steps}, fh)
+    os.rename(tmpFile, cacheFile)
+    return steps
+
+def buildRoutines(experiment, steps):
+    """
+    Generate the routines of a plan, building each one only when it is needed.
+
+    Parameters
+    ----------
+    experiment : Experiment
+        The experiment the routines belong to.
+    steps : list
+        The (routine, arguments) pairs of the plan.
+    """
+    for routine, args in steps:
+        yield getattr(routines, routine)(experiment, **args)
+
+def planRunner(specFile, stimuliFolder = const.DEFAULT_STIMULI_FOLDER):
+    """
+    Make a buildRun function (see Session) which builds runs from a task spec.
+
+    Parameters
+    ----------
+    specFile : str
+        Path of the task spec.
+    stimuliFolder : str
+        Folder the stimuli columns are relative to.
+
+    Returns
+    -------
+    callable
+        buildRun(experiment, runFile) generating the routines of a run.
+    """
+    def buildRun(experiment, runFile):
+        return buildRoutines(experiment, loadPlan(specFile, runFile, stimuliFolder))
+    return buildRun
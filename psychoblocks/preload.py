@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module keeps a sliding window of upcoming routines prepared so that stimuli
+are only loaded shortly before they are needed and freed once they have been shown, and
+schedules such work into the idle time of frames (e.g during fixation and rest).
+"""
+from collections import deque
+from psychopy import logging
+
+import const
+
+class Preloader(object):
+    """
+    Schedules the preparation and release of routines.
+
+    Routines are prepared lazily: schedule() only queues them, and the queued work is
+    carried out one routine at a time by service() (e.g during fixation frames).  Any
+    routine which is about to be run is prepared immediately by prepare().
+
+    Attributes
+    ----------
+    window : int
+        Number of upcoming routines to keep prepared.
+    """
+
+    def __init__(self, window = const.PRELOAD_WINDOW):
+        """
+        Initialize an instance of Preloader.
+
+        Parameters
+        ----------
+        window : int
+            Number of upcoming routines to keep prepared.
+        """
+        self._window = window
+        self._pending = deque()
+        self._resident = list()
+
+    def schedule(self, routines):
+        """
+        Queue upcoming routines for preparation.
+
+        Parameters
+        ----------
+        routines : list
+            The next routines to be run, in the order they will be run.  Only the first
+            window routines are queued.
+        """
+        for routine in routines[:self.window]:
+            if routine not in self._resident and routine not in self._pending:
+                self._pending.append(routine)
+
+    def service(self):
+        """
+        Prepare the next pending routine, if any.
+
+        Returns
+        -------
+        bool
+            True if a routine was prepared.
+        """
+        if not self._pending:
+            return False
+        self.prepare(self._pending.popleft())
+        return True
+
+    def prepare(self, routine):
+        """
+        Prepare a routine immediately if it is not already resident.
+
+        Parameters
+        ----------
+        routine : AbstractFeature
+            The routine to prepare.
+        """
+        if routine in self._resident:
+            return
+        if routine in self._pending:
+            self._pending.remove(routine)
+        logging.debug('preparing routine '+type(routine).__name__)
+        routine.prepare()
+        self._resident.append(routine)
+
+    def release(self, routine):
+        """
+        Release a routine which has finished running.
+
+        Parameters
+        ----------
+        routine : AbstractFeature
+            The routine to release.
+        """
+        if routine in self._resident:
+            self._resident.remove(routine)
+        routine.release()
+
+    @property
+    def window(self):
+        return self._window
+
+    @property
+    def resident(self):
+        return len(self._resident)
+
+class IdleScheduler(object):
+    """
+    Carries out background work in the idle time between flips.
+
+    Work comes from sources: callables which do one small unit of work (e.g prepare one
+    routine) and return True, or return False when they have nothing to do.  One-off
+    callables can also be submitted.  Loops call service() after each flip with the time
+    they can spare, and work is carried out until that budget is used up, so heavy work
+    (decoding, uploading and compositing the next routine's stimuli) lands on idle frames
+    rather than on the first frame of a trial.
+
+    Attributes
+    ----------
+    frames : int
+        Number of frames serviced.
+    busyFrames : int
+        Number of frames in which work was carried out.
+    overruns : int
+        Number of frames in which the work took longer than the budget.
+    """
+
+    def __init__(self, clock):
+        """
+        Initialize an instance of IdleScheduler.
+
+        Parameters
+        ----------
+        clock : clock.Clock
+            Clock used to measure the time spent working.
+        """
+        self._clock = clock
+        self._sources = list()
+        self._tasks = deque()
+        self.resetStats()
+
+    def resetStats(self):
+        """
+        Reset the budget usage counters.
+        """
+        self._frames = 0
+        self._busyFrames = 0
+        self._overruns = 0
+        self._used = 0.0
+        self._budget = 0.0
+        self._maxUsage = 0.0
+
+    def addSource(self, source):
+        """
+        Add a source of work.
+
+        Parameters
+        ----------
+        source : callable
+            Called with no arguments to do one unit of work.  Returns whether there was
+            any work to do.
+        """
+        self._sources.append(source)
+
+    def submit(self, task):
+        """
+        Queue a one-off piece of work, carried out before any work from the sources.
+
+        Parameters
+        ----------
+        task : callable
+            Called with no arguments.
+        """
+        self._tasks.append(task)
+
+    def _step(self):
+        """
+        Do one unit of work.  Returns False if there was nothing to do.
+        """
+        if self._tasks:
+            self._tasks.popleft()()
+            return True
+        for source in self._sources:
+            if source():
+                return True
+        return False
+
+    def service(self, budget):
+        """
+        Carry out work until the budget is used up or there is nothing left to do.
+
+        A unit of work is never interrupted, so a single long unit can overrun the budget.
+
+        Parameters
+        ----------
+        budget : float
+            Time in seconds which may be spent.
+
+        Returns
+        -------
+        float
+            Time in seconds which was spent.
+        """
+        start = self._clock.getTime()
+        elapsed = 0.0
+        busy = False
+        while elapsed < budget and self._step():
+            busy = True
+            elapsed = self._clock.getTime() - start
+
+        self._frames += 1
+        self._budget += budget
+        if busy:
+            self._busyFrames += 1
+            self._used += elapsed
+            self._maxUsage = max(self._maxUsage, elapsed / budget if budget else 0.0)
+            if elapsed > budget:
+                self._overruns += 1
+        return elapsed
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            The budget usage counters, suitable for logging.  Usage is the fraction of
+            the budget spent working (over all frames, and in the worst frame).
+        """
+        return {'frames'     : self.frames,
+                'busyFrames' : self.busyFrames,
+                'overruns'   : self.overruns,
+                'usage'      : self._used / self._budget if self._budget else 0.0,
+                'maxUsage'   : self._maxUsage}
+
+    @property
+    def frames(self):
+        return self._frames
+
+    @property
+    def busyFrames(self):
+        return self._busyFrames
+
+    @property
+    def overruns(self):
+        return self._overruns
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module pre-renders stimuli at the size they will be displayed and stores them as
+raw numpy arrays, so that loading a stimulus copies its pixels once instead of decoding
+(and resizing) a JPEG on every run.
+
+Entries are named by the SHA-1 of the source file and the window size, so editing a
+stimulus or changing the screen resolution simply results in a cache miss.
+"""
+import os
+import hashlib
+import numpy
+from PIL import Image
+
+import const
+
+_hashes = dict()
+
+def fitSize(imageSize, windowSize):
+    """
+    Find the largest size at which an image fits within the window.
+
+    Images are only ever downscaled; images which already fit keep their size.
+
+    Parameters
+    ----------
+    imageSize : tuple
+        (width, height) of the source image in pixels.
+    windowSize : tuple
+        (width, height) of the window in pixels.
+
+    Returns
+    -------
+    tuple
+        (width, height) at which to render the image.
+    """
+    scale = min(1.0, float(windowSize[0]) / imageSize[0], float(windowSize[1]) / imageSize[1])
+    return (max(1, int(round(imageSize[0] * scale))), max(1, int(round(imageSize[1] * scale))))
+
+def sourceHash(path):
+    """
+    SHA-1 of the contents of a source image.  Hashes are memoized on path, size and mtime.
+
+    Parameters
+    ----------
+    path : str
+        Path to the source image.
+
+    Returns
+    -------
+    str
+        Hex digest of the file contents.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if key not in _hashes:
+        sha = hashlib.sha1()
+        with open(path, 'rb') as fh:
+            sha.update(fh.read())
+        _hashes[key] = sha.hexdigest()
+    return _hashes[key]
+
+def cachePath(path, windowSize, cacheFolder = None):
+    """
+    Path of the pre-rendered entry for a source image.
+
+    Parameters
+    ----------
+    path : str
+        Path to the source image.
+    windowSize : tuple
+        (width, height) of the window in pixels.
+    cacheFolder : str
+        Folder holding the pre-rendered entries.  Defaults to const.PRERENDER_FOLDER 
+        within the folder of the source image.
+
+    Returns
+    -------
+    str
+        Path to the .npy entry (which may not exist yet).
+    """
+    if cacheFolder is None:
+        cacheFolder = os.path.join(os.path.dirname(path), const.PRERENDER_FOLDER)
+    name = '%s_%dx%d.npy' % (sourceHash(path), windowSize[0], windowSize[1])
+    return os.path.join(cacheFolder, name)
+
+def render(path, windowSize):
+    """
+    Decode a source image and resize it to fit the window.
+
+    Parameters
+    ----------
+    path : str
+        Path to the source image.
+    windowSize : tuple
+        (width, height) of the window in pixels.
+
+    Returns
+    -------
+    PIL.Image.Image
+        The rendered RGB image.
+    """
+    image = Image.open(path).convert('RGB')
+    size = fitSize(image.size, windowSize)
+    if size != image.size:
+        image = image.resize(size, Image.ANTIALIAS)
+    return image
+
+def prerender(path, windowSize, cacheFolder = None):
+    """
+    Render a source image and store it in the cache folder.
+
+    Parameters
+    ----------
+    path : str
+        Path to the source image.
+    windowSize : tuple
+        (width, height) of the window in pixels.
+    cacheFolder : str
+        Folder holding the pre-rendered entries.
+
+    Returns
+    -------
+    str
+        Path to the .npy entry.
+    """
+    entry = cachePath(path, windowSize, cacheFolder)
+    if not os.path.exists(entry):
+        folder = os.path.dirname(entry)
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        # write to a temporary file first so a partial entry is never loaded
+        tmp = entry + '.tmp'
+        with open(tmp, 'wb') as fh:
+            numpy.save(fh, numpy.asarray(render(path, windowSize), dtype = numpy.uint8))
+        os.rename(tmp, entry)
+    return entry
+
+def loadImage(path, windowSize, cacheFolder = None):
+    """
+    Load a stimulus at display size from its pre-rendered entry if it exists, and by
+    decoding the source image otherwise.  The entry is memory mapped and its pixels are
+    copied once into the returned image, without decoding.
+
+    Parameters
+    ----------
+    path : str
+        Path to the source image.
+    windowSize : tuple
+        (width, height) of the window in pixels.
+    cacheFolder : str
+        Folder holding the pre-rendered entries.
+
+    Returns
+    -------
+    PIL.Image.Image
+        The rendered RGB image.
+    """
+    entry = cachePath(path, windowSize, cacheFolder)
+    if os.path.exists(entry):
+        return Image.fromarray(numpy.load(entry, mmap_mode = 'r'), 'RGB')
+    return render(path, windowSize)
@@ -5,7 +5,6 @@
 # PyschoPy Version: 1.85.3
 # Python Version:   2.7.5
 ###############################################################################
-from psychopy import core, visual, event
 from abc import ABCMeta, abstractmethod
 import const
 from abstracts import *
@@ -35,7 +34,7 @@ class Fixation(AbstractCollection):
         super(Fixation,self).__init__(None, experiment = experiment)
         feature = EscapeCheck(None, experiment = experiment)
         feature = TextFeature(feature, text = '+', name = 'Fixation')
-        feature = TimedLoop(feature, duration)
+        feature = TimedLoop(feature, duration, idle = True)
         self._feature = feature
          
     @property
@@ -48,13 +47,19 @@ class RestBlock(AbstractCollection):
         super(RestBlock,self).__init__(None, experiment = experiment)
         feature = EscapeCheck(None, experiment = experiment)
         feature = TextFeature(feature, text = '+', name = 'Rest Block')
-        feature = TimedLoop(feature, duration)
+        feature = TimedLoop(feature, duration, idle = True)
         self._feature = feature
     
     @property
     def feature(self):
         return self._feature
 
+    def run(self):
+        # make sure the previous block is safely on disk
+        self.feature.experiment.experimentHandler.sync()
+        self.feature.experiment.eventLog.flush()
+        super(RestBlock,self).run()
+
 ###############################################################################
 # Facename Collections
 ###############################################################################
@@ -106,7 +111,8 @@ class NovelTrial(AbstractCollection):
         feature = TextFeature(feature, text= name, pos= (0,-.6), name= 'Novel Trial Name: '+name)
         feature = TextFeature(feature, text = "Does this face 'fit' this name?", 
                                        pos=(0,-.8), name = 'Novel Trial Prompt')
-        feature = TimedLoop(feature, duration)
+        feature = CompositeFeature(feature, name = 'Novel Trial Composite')
+        feature = TimedLoop(feature, duration, record = True)
         self._feature = feature
      
     @property
@@ -128,7 +134,8 @@ class KnownTrial(AbstractCollection):
         feature = ImageFeature(feature, image = image, name = 'Known Trial Image: ' + image)
         feature = TextFeature(feature, text=name1, pos=(-.3,-.6), name='Known Trial Name1: '+name1)
         feature = TextFeature(feature, text=name2, pos=(0.3,-.6), name='Known Trial Name2: '+name2)
-        feature = TimedLoop(feature, duration)
+        feature = CompositeFeature(feature, name = 'Known Trial Composite')
+        feature = TimedLoop(feature, duration, record = True)
         self._feature = feature
         
 
@@ -245,7 +252,8 @@ class NBackTrial(AbstractCollection):
         feature = ImageFeature(feature, image = image, name = 'Trial: '+image)
         feature = TextFeature(feature, text = 'MATCH', name = 'Match Prompt', pos = (-.33, -.66))
         feature = TextFeature(feature, text = 'NO MATCH', name = 'Match Prompt', pos = (.33,-.66))
-        feature = TimedLoop(feature, duration) 
+        feature = CompositeFeature(feature, name = 'Trial Composite')
+        feature = TimedLoop(feature, duration, record = True) 
 
         self._feature = feature
 
@@ -265,6 +273,7 @@ class ZeroBackCue(AbstractCollection):
         feature = EscapeCheck(None, experiment = experiment)
         feature = ImageFeature(feature,image=image,name='Zero Back Cue Image: '+image,pos=(0.33,0))
         feature = TextFeature(feature, text = '0 - BACK', name = 'Zero Back Cue Text',pos=(-.5,0))
+        feature = CompositeFeature(feature, name = 'Zero Back Cue Composite')
         feature = TimedLoop(feature, duration) 
         
         self._feature = feature
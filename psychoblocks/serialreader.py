@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module drains the response box on a background thread so that each byte is
+timestamped when it arrives rather than when the render loop gets around to reading it.
+"""
+import threading
+from collections import deque, namedtuple
+from psychopy import logging
+
+import const
+from abstracts import AbstractResponseDevice
+
+SerialEvent = namedtuple('SerialEvent', ['code', 'timestamp'])
+"""
+namedtuple: a byte read from the response box (as an int) and the clock time it arrived
+"""
+
+class SerialReader(AbstractResponseDevice):
+    """
+    Background thread which continuously reads a serial port.
+
+    Events are pushed onto a deque, which is safe to append to and pop from across 
+    threads without locking, and consumed by the features (e.g ResponseBox and MRISync) 
+    on the render thread.
+
+    Attributes
+    ----------
+    port : serial.Serial
+        The port being read.
+    clock : clock.Clock
+        The clock used to timestamp events.
+    """
+
+    def __init__(self, port, clock):
+        """
+        Initialize an instance of SerialReader and start reading.
+
+        Parameters
+        ----------
+        port : serial.Serial
+            The port to read.  Its timeout is set to const.SERIAL_READ_TIMEOUT so the
+            thread sleeps in the kernel while no data is available.
+        clock : clock.Clock
+            The clock used to timestamp events.
+        """
+        self._port = port
+        self._clock = clock
+        self._events = deque()
+        self._arrived = threading.Event()
+        self._running = True
+
+        self.port.timeout = const.SERIAL_READ_TIMEOUT
+        self.port.reset_input_buffer()
+
+        self._thread = threading.Thread(target = self._read, name = 'SerialReader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _read(self):
+        """
+        Read from the port until stopped.  Bytes which arrive together share a timestamp.
+        """
+        while self._running:
+            try:
+                data = self.port.read(size = max(1, self.port.in_waiting))
+            except Exception as e:
+                logging.error('Response box read failed: '+str(e))
+                self._running = False
+                break
+            if data:
+                timestamp = self.clock.getTime()
+                for byte in bytearray(data):
+                    self._events.append(SerialEvent(byte, timestamp))
+                self._arrived.set()
+        # wake anyone waiting so they don't block forever on a dead reader
+        self._arrived.set()
+
+    def poll(self):
+        """
+        Remove and return all events received so far.
+
+        Returns
+        -------
+        list
+            SerialEvents in the order they arrived.
+        """
+        events = list()
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+    def waitFor(self, code, timeout = None):
+        """
+        Block until an event with the given code arrives, discarding any other events.
+
+        The calling thread sleeps until the reader thread signals that data has arrived,
+        so no CPU is used while waiting.  The event's timestamp is taken by the reader 
+        thread on arrival, so it is unaffected by how long the caller takes to wake.
+
+        Parameters
+        ----------
+        code : int
+            The byte code to wait for (e.g const.TLL_PULSE).
+        timeout : float
+            Maximum seconds to wait, or None to wait indefinitely.  Note that on python 2
+            waiting with a timeout wakes periodically, so prefer None where possible.
+
+        Returns
+        -------
+        SerialEvent
+            The matching event, or None if the timeout expired or the reader stopped.
+        """
+        if timeout is not None:
+            deadline = self.clock.getTime() + timeout
+        while True:
+            while self._events:
+                event = self._events.popleft()
+                if event.code == code:
+                    return event
+            if not self._running:
+                return None
+            # clear before checking again so an arrival in between isn't missed
+            self._arrived.clear()
+            if self._events:
+                continue
+            if timeout is None:
+                self._arrived.wait()
+            else:
+                remaining = deadline - self.clock.getTime()
+                if remaining <= 0:
+                    return None
+                self._arrived.wait(remaining)
+
+    def reset(self):
+        """
+        Discard any events which have not been consumed.
+        """
+        self._events.clear()
+
+    def stop(self):
+        """
+        Stop the reader thread.
+        """
+        self._running = False
+        self._thread.join()
+
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def clock(self):
+        return self._clock
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module runs several runs (and participants) of a task in one process, so that the
+window, response box, stimulus cache and frame rate calibration are only set up once.
+"""
+from simulation import SimulatedResponseDevice
+
+class Session(object):
+    """
+    A queue of runs carried out one after the other by the same experiment.
+
+    Each run gets its own data files (see Experiment.startRun).  In simulated mode every
+    run gets a fresh simulated response device seeded by its position in the queue, so
+    batches are reproducible.
+
+    Attributes
+    ----------
+    experiment : Experiment
+        The experiment the runs are carried out by.
+    runs : list
+        The queued (runFile, participant) pairs.
+    """
+
+    def __init__(self, experiment, buildRun, introduction = None):
+        """
+        Parameters
+        ----------
+        experiment : Experiment
+            The experiment the runs are carried out by.
+        buildRun : callable
+            buildRun(experiment, runFile) returns an iterable of the routines of a run.
+        introduction : callable
+            introduction(experiment) returns the routines shown before each run, such
+            as the instructions and countdown.
+        """
+        self._experiment = experiment
+        self._buildRun = buildRun
+        self._introduction = introduction
+        self._runs = list()
+
+    def addRun(self, runFile, participant = None):
+        """
+        Queue a run.
+
+        Parameters
+        ----------
+        runFile : str
+            Path of the run file.  Defaults to the experiment's run file.
+        participant : str
+            Participant the run is for.  Defaults to the experiment's participant.
+        """
+        self._runs.append((runFile, participant))
+
+    def run(self):
+        """
+        Carry out the queued runs in order.  If none were queued, the run file and
+        participant from the experiment parameters are used.
+        """
+        runs = self._runs or [(self.experiment.runFile, None)]
+        for index, (runFile, participant) in enumerate(runs):
+            runFile = runFile or self.experiment.runFile
+            self.experiment.startRun(runFile, participant)
+            if self.experiment.mode == 'simulated':
+                self.experiment.setResponseDevice(
+                        SimulatedResponseDevice(self.experiment.clock, seed = index))
+            if self._introduction:
+                self.experiment.addRoutines(self._introduction(self.experiment))
+            self.experiment.addRoutines(self._buildRun(self.experiment, runFile))
+            self.experiment.run()
+        self._runs = list()
+
+    @property
+    def experiment(self):
+        return self._experiment
+
+    @property
+    def runs(self):
+        return list(self._runs)
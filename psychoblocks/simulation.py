@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module simulates the response box and the scanner so that the input path can be
+exercised without hardware.
+"""
+import os
+import atexit
+import weakref
+import heapq
+import random
+import threading
+import time
+from collections import deque
+
+import const
+from abstracts import AbstractResponseDevice
+from serialreader import SerialEvent, SerialReader
+
+_openDevices = weakref.WeakSet()
+
+@atexit.register
+def _stopOpenDevices():
+    """
+    Stop the pseudo terminal devices still running at exit, before their threads are
+    torn down with the interpreter
+    """
+    for device in list(_openDevices):
+        device.stop()
+
+def gaussianLatency(mean = const.SIMULATED_LATENCY_MEAN, sd = const.SIMULATED_LATENCY_SD, 
+                    minimum = 0.1):
+    """
+    Create a latency distribution for SimulatedResponseDevice.
+
+    Parameters
+    ----------
+    mean : float
+        Mean latency in seconds.
+    sd : float
+        Standard deviation of the latency in seconds.
+    minimum : float
+        Latencies are clipped so that they are never shorter than this.
+
+    Returns
+    -------
+    callable
+        Function taking a random.Random and returning a latency in seconds.
+    """
+    return lambda rng: max(minimum, rng.gauss(mean, sd))
+
+class SimulatedResponseDevice(AbstractResponseDevice):
+    """
+    Stand-in for the response box which emits TLL pulses every TR and button presses a
+    random latency after each pulse.
+
+    Events are generated from the clock rather than on a thread, so the device works with
+    both the real clock and the SimulatedClock used when headless.  When waiting for an
+    event, a SimulatedClock is advanced to the event rather than sleeping.
+
+    Attributes
+    ----------
+    clock : clock.Clock
+        The clock used to timestamp events.
+    tr : float
+        Seconds between pulses.
+    """
+
+    def __init__(self, clock, tr = const.SIMULATED_TR, latency = None, 
+                 responseRate = const.SIMULATED_RESPONSE_RATE, buttons = None, 
+                 script = None, seed = None):
+        """
+        Initialize an instance of SimulatedResponseDevice.  The first pulse arrives one TR
+        after initialization.
+
+        Parameters
+        ----------
+        clock : clock.Clock
+            The clock used to timestamp events.
+        tr : float
+            Seconds between pulses.
+        latency : callable
+            Function taking a random.Random and returning the seconds between a pulse and 
+            the following press.  Defaults to gaussianLatency().
+        responseRate : float
+            Probability of a press following each pulse.
+        buttons : list
+            Byte codes to choose presses from at random.  Defaults to the index and
+            middle fingers of the right hand.
+        script : list
+            Byte codes to press in order (None entries skip a pulse).  When exhausted,
+            presses are chosen at random from buttons.
+        seed : int
+            Seed for the random number generator so runs can be reproduced.
+        """
+        self._clock = clock
+        self._tr = tr
+        self._latency = latency if latency else gaussianLatency()
+        self._responseRate = responseRate
+        self._buttons = buttons if buttons else [const.RIGHT_INDEX, const.RIGHT_MIDDLE]
+        self._script = list(script) if script else list()
+        self._random = random.Random(seed)
+        self._pending = list()
+        self._nextPulse = self.clock.getTime() + tr
+        self._counter = 0
+
+    def _push(self, code, timestamp):
+        """
+        Add an event to the pending heap.  The counter keeps events with equal 
+        timestamps in the order they were generated.
+        """
+        heapq.heappush(self._pending, (timestamp, self._counter, SerialEvent(code, timestamp)))
+        self._counter += 1
+
+    def _generate(self, until):
+        """
+        Generate every pulse (and the press following it) up to the given time.
+        """
+        while self._nextPulse <= until:
+            self._push(const.TLL_PULSE, self._nextPulse)
+            if self._script:
+                code = self._script.pop(0)
+            elif self._random.random() < self._responseRate:
+                code = self._random.choice(self._buttons)
+            else:
+                code = None
+            if code is not None:
+                self._push(code, self._nextPulse + self._latency(self._random))
+            self._nextPulse += self.tr
+
+    def _sleep(self, until):
+        """
+        Wait until the given time, advancing the clock if it is simulated.
+        """
+        remaining = until - self.clock.getTime()
+        if remaining <= 0:
+            return
+        if hasattr(self.clock, 'advance'):
+            self.clock.advance(remaining)
+        else:
+            time.sleep(remaining)
+
+    def poll(self):
+        now = self.clock.getTime()
+        self._generate(now)
+        events = list()
+        while self._pending and self._pending[0][0] <= now:
+            events.append(heapq.heappop(self._pending)[2])
+        return events
+
+    def waitFor(self, code, timeout = None):
+        if timeout is not None:
+            deadline = self.clock.getTime() + timeout
+        while True:
+            for event in self.poll():
+                if event.code == code:
+                    return event
+            # the next event is either pending or the next pulse
+            self._generate(self._nextPulse)
+            nextTime = self._pending[0][0]
+            if timeout is not None and nextTime > deadline:
+                self._sleep(deadline)
+                return None
+            self._sleep(nextTime)
+
+    def reset(self):
+        self.poll()
+
+    def stop(self):
+        pass
+
+    @property
+    def clock(self):
+        return self._clock
+
+    @property
+    def tr(self):
+        return self._tr
+
+class PtyResponseDevice(SimulatedResponseDevice):
+    """
+    Simulated scanner and participant which write their bytes to a pseudo terminal read
+    by a SerialReader, so that the reader thread, its deque and waitFor are exercised
+    exactly as in serial mode.
+
+    The pulses and presses are scheduled as by SimulatedResponseDevice, but written on a
+    background thread at their scheduled (wall clock) times, so the device needs the real
+    clock rather than a SimulatedClock.  For every event handed out by poll or waitFor
+    the time from the write to the reader timestamping it (arrival) and to the event
+    being returned (delivery) is recorded.  Requires pyserial and a posix system.
+
+    Attributes
+    ----------
+    clock : clock.Clock
+        The clock used to timestamp events.
+    tr : float
+        Seconds between pulses.
+    reader : SerialReader
+        The reader of the pseudo terminal.
+    latencies : list
+        (code, arrival, delivery) of every event handed out, in seconds.
+    """
+
+    def __init__(self, clock, tr = const.SIMULATED_TR, latency = None, 
+                 responseRate = const.SIMULATED_RESPONSE_RATE, buttons = None, 
+                 script = None, seed = None):
+        """
+        Initialize an instance of PtyResponseDevice and start writing.  The first pulse
+        arrives one TR after initialization.
+
+        Parameters
+        ----------
+        See SimulatedResponseDevice.
+        """
+        import serial
+        super(PtyResponseDevice,self).__init__(clock, tr, latency, responseRate, buttons,
+                                               script, seed)
+        self._master, self._slave = os.openpty()
+        self._port = serial.Serial(port = os.ttyname(self._slave))
+        self._reader = SerialReader(self._port, clock)
+        # write times of the bytes not yet handed out, in the order they were written
+        self._written = deque()
+        self._latencies = list()
+        self._stopped = threading.Event()
+
+        self._thread = threading.Thread(target = self._write, name = 'PtyResponseDevice')
+        self._thread.daemon = True
+        self._thread.start()
+        _openDevices.add(self)
+
+    def _write(self):
+        """
+        Write the scheduled events to the pseudo terminal until stopped.
+        """
+        while not self._stopped.is_set():
+            # the next pulse is always pending, so the earliest pending event is next
+            self._generate(self._nextPulse)
+            timestamp, _, event = heapq.heappop(self._pending)
+            remaining = timestamp - self.clock.getTime()
+            if remaining > 0 and self._stopped.wait(remaining):
+                break
+            # noted before writing so the reader can never see the byte first
+            self._written.append((event.code, self.clock.getTime()))
+            os.write(self._master, bytes(bytearray([event.code])))
+
+    def _deliver(self, event):
+        """
+        Record the latencies of an event which is being handed out.  Events the reader
+        discarded (e.g while waiting for a pulse) are skipped over, since bytes arrive in
+        the order they were written.
+        """
+        now = self.clock.getTime()
+        while self._written:
+            code, written = self._written.popleft()
+            if code == event.code:
+                self._latencies.append((code, event.timestamp - written, now - written))
+                break
+        return event
+
+    def poll(self):
+        return [self._deliver(event) for event in self._reader.poll()]
+
+    def waitFor(self, code, timeout = None):
+        event = self._reader.waitFor(code, timeout)
+        if event is None:
+            return None
+        return self._deliver(event)
+
+    def stop(self):
+        """
+        Stop writing and reading, and close the pseudo terminal.
+        """
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._reader.stop()
+        self._port.close()
+        os.close(self._master)
+        os.close(self._slave)
+        _openDevices.discard(self)
+
+    def stats(self):
+        """
+        Summarise the recorded latencies.
+
+        Returns
+        -------
+        dict
+            The number of events and the median and maximum arrival and delivery
+            latencies in seconds.
+        """
+        stats = {'events' : len(self._latencies)}
+        for column, name in ((1, 'arrival'), (2, 'delivery')):
+            values = sorted(latency[column] for latency in self._latencies)
+            stats[name+' median'] = values[len(values) // 2] if values else None
+            stats[name+' max'] = values[-1] if values else None
+        return stats
+
+    @property
+    def reader(self):
+        return self._reader
+
+    @property
+    def latencies(self):
+        return self._latencies
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Written by:       Forrest Koch (forrest.koch@unsw.edu.au)
+# Organization:     Centre for Healthy Brain Ageing (UNSW)
+# PyschoPy Version: 1.85.3
+# Python Version:   2.7.5
+###############################################################################
+"""
+This module keeps track of how long each stage of starting an experiment takes.
+
+Import it before anything else so that the first stage includes the imports.
+"""
+import timeit
+
+_start = timeit.default_timer()
+_marks = list()
+
+def mark(stage):
+    """
+    Mark the end of a startup stage.
+
+    Parameters
+    ----------
+    stage : str
+        Name of the stage which has just finished.
+    """
+    _marks.append((stage, timeit.default_timer()))
+
+def breakdown():
+    """
+    Returns
+    -------
+    list
+        (stage, seconds) for each marked stage, in order.
+    """
+    stages = list()
+    previous = _start
+    for stage, t in _marks:
+        stages.append((stage, t - previous))
+        previous = t
+    return stages
+
+def report():
+    """
+    Returns
+    -------
+    str
+        A readable summary of the startup stages and the total.
+    """
+    stages = breakdown()
+    lines = ['%-20s %8.3f s' % (stage, seconds) for stage, seconds in stages]
+    lines.append('%-20s %8.3f s' % ('total', sum(seconds for stage, seconds in stages)))
+    return '\n'.join(lines)
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+
+# benchmark the feature chain headless: routine construction cost, per frame
+# overhead of the decorator chain, and build/run time of synthetic runs
+# usage: benchmark.py [output.json [trial counts...]]
+import sys
+import os
+import json
+import platform
+import tempfile
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+from psychoblocks import const, experiment, routines
+from psychoblocks.abstracts import CompiledChain
+
+TRIALS_PER_BLOCK = 10
+CONSTRUCTIONS = 200
+FRAMES = 10000
+EXECUTE_LIMIT = 100
+
+outfile = sys.argv[1] if len(sys.argv) > 1 else None
+sizes = [int(n) for n in sys.argv[2:]] or [10, 100, 1000, 10000]
+
+stimuli = sorted(os.listdir(const.DEFAULT_STIMULI_FOLDER))
+stimuli = [os.path.join(const.DEFAULT_STIMULI_FOLDER, s) for s in stimuli if s.endswith('.jpg')]
+
+app = experiment.Experiment('1back', headless = True,
+                            info = {'results folder' : tempfile.mkdtemp()})
+
+def buildRun(trials):
+    """
+    Add a synthetic 1back run with the given number of trials to the app.
+    """
+    for i in range(trials):
+        if i % TRIALS_PER_BLOCK == 0:
+            if i:
+                app.addRoutine(routines.RestBlock(app, duration = 15.0))
+            app.addRoutine(routines.OneBackCue(app))
+        else:
+            app.addRoutine(routines.Fixation(app, duration = 0.5))
+        app.addRoutine(routines.NBackTrial(app, stimuli[i % len(stimuli)], None))
+
+def timeConstruction(factory):
+    start = timeit.default_timer()
+    for i in range(CONSTRUCTIONS):
+        factory(i)
+    return (timeit.default_timer() - start) / CONSTRUCTIONS
+
+results = dict()
+results['platform'] = {'python' : platform.python_version(), 'machine' : platform.machine(),
+                       'system' : platform.system()}
+
+# cost of building a single routine
+results['construction'] = {
+    'NBackTrial' : timeConstruction(lambda i: routines.NBackTrial(app, stimuli[i % len(stimuli)],
+                                                                  None)),
+    'Fixation'   : timeConstruction(lambda i: routines.Fixation(app, duration = 0.5)),
+    'RestBlock'  : timeConstruction(lambda i: routines.RestBlock(app, duration = 15.0)),
+}
+
+# per frame overhead of the trial decorator chain (everything inside the TimedLoop)
+trial = routines.NBackTrial(app, stimuli[0], None)
+trial.prepare()
+def timeFrames(chain):
+    chain.start()
+    start = timeit.default_timer()
+    for i in range(FRAMES):
+        chain.run()
+    frameTime = (timeit.default_timer() - start) / FRAMES
+    chain.end()
+    return frameTime
+
+results['frame'] = {'chain'    : timeFrames(trial.feature.origin), 
+                    'compiled' : timeFrames(CompiledChain(trial.feature.origin)), 
+                    'frames'   : FRAMES}
+trial.release()
+
+# build (and for small runs execute) whole synthetic runs
+results['runs'] = list()
+for size in sizes:
+    start = timeit.default_timer()
+    buildRun(size)
+    build = timeit.default_timer() - start
+    run = {'trials' : size, 'build' : build, 'buildPerTrial' : build / size}
+    if size <= EXECUTE_LIMIT:
+        simStart = app.clock.getTime()
+        start = timeit.default_timer()
+        app.run()
+        run['execute'] = timeit.default_timer() - start
+        run['simulated'] = app.clock.getTime() - simStart
+        run['speedup'] = run['simulated'] / run['execute']
+    else:
+        # discard the routines without running them
+        app.clearRoutines()
+    results['runs'].append(run)
+    print('%d trials: built in %.3f s' % (size, build))
+
+if outfile:
+    with open(outfile, 'w') as fh:
+        json.dump(results, fh, indent = 2, sort_keys = True)
+else:
+    print(json.dumps(results, indent = 2, sort_keys = True))
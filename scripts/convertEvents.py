@@ -0,0 +1,17 @@
+#!/usr/bin/python
+
+# convert a binary event log into a csv or a columnar numpy archive (.npz)
+# usage: convertEvents.py events.bin output.csv|output.npz
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from psychoblocks import eventlog
+
+infile = sys.argv[1]
+outfile = sys.argv[2]
+
+if outfile.endswith('.npz'):
+    eventlog.toColumns(infile, outfile)
+else:
+    eventlog.toCSV(infile, outfile)
@@ -0,0 +1,28 @@
+#!/usr/bin/python
+
+# pre-render every image in the stimuli folder at the display size so that
+# ImageFeature can copy their pixels rather than decoding the jpegs each run
+# usage: prerenderStimuli.py stimuliFolder [width height [cacheFolder]]
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from psychoblocks import const, prerender
+
+stimuliFolder = sys.argv[1]
+if len(sys.argv) > 3:
+    windowSize = (int(sys.argv[2]), int(sys.argv[3]))
+else:
+    windowSize = (int(const.DEFAULT_SCREEN_WIDTH), int(const.DEFAULT_SCREEN_HEIGHT))
+cacheFolder = sys.argv[4] if len(sys.argv) > 4 else None
+
+count = 0
+for stim in sorted(os.listdir(stimuliFolder)):
+    path = os.path.join(stimuliFolder, stim)
+    if not os.path.isfile(path) or not stim.lower().endswith(('.jpg', '.jpeg', '.png')):
+        continue
+    entry = prerender.prerender(path, windowSize, cacheFolder)
+    print(stim + ' -> ' + entry)
+    count += 1
+
+print('pre-rendered %d stimuli at %dx%d' % (count, windowSize[0], windowSize[1]))